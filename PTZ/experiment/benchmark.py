@@ -0,0 +1,199 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from os.path import abspath, dirname, join
+from socket import AF_INET, SOCK_DGRAM, socket
+
+import numpy as np
+
+from ground_station import Shanghai_location, data_dir, get_satellite_position_angle, ts
+from skyfield.api import load
+from utils.ptz_command import azimuth_command, elevation_command, encode_packet, send_command
+from utils.sig import add_noise, fast_analysis, gen_preamble, gen_symbols, gen_up_chirp, slicing, spectrogram, welch_psd
+
+# 基准测试：过境搜索、过境采样、Pelco-D 编码/发送和 sig.py 的信号处理热点。
+# 固定随机种子和固定的 TLE 文件(data/tle/60745)，结果存为 JSON，便于不同提交之间对比：
+#   python benchmark.py                      # 跑全部，写到 data/benchmark/<时间>_<提交>.json
+#   python benchmark.py -k sig --compare old.json
+
+SEED = 20241126
+TLE_FIXTURE = join(data_dir, "tle", "60745", "2024-11-26", "2024-11-26.tle")
+START_TIME = datetime(2024, 11, 26, 0, 0, tzinfo=timezone.utc)
+TICK_TIMES = (1000, 200, 50, 20)  # 毫秒
+
+SAMP_RATE = 1e6
+SF = 10
+BW = 125e3
+
+
+def bench(fn, repeat=5, number=1, warmup=1) -> dict:
+    # 每轮调用 fn number 次，返回单次调用耗时(秒)的统计
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    times = np.array(times)
+    return {
+        "min": float(times.min()),
+        "median": float(np.median(times)),
+        "mean": float(times.mean()),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def bench_pass_search(results: dict):
+    satellite = load.tle_file(TLE_FIXTURE)[0]
+    t0 = ts.from_datetime(START_TIME)
+    for days in (1, 7, 21):
+        t1 = ts.from_datetime(START_TIME + timedelta(days=days))
+        results[f"pass_search.find_events_{days}d"] = bench(
+            lambda: satellite.find_events(Shanghai_location, t0, t1, altitude_degrees=0.0), repeat=3
+        )
+
+
+def bench_pass_sampling(results: dict):
+    # get_satellite_position_angle 端到端(搜索 + 按 tick 采样)，不画图
+    for tick in TICK_TIMES:
+        results[f"pass_sampling.get_satellite_position_angle_{tick}ms"] = bench(
+            lambda: get_satellite_position_angle(TLE_FIXTURE, Shanghai_location, tick, 60, START_TIME, plot=False),
+            repeat=3,
+        )
+
+
+def bench_ptz_packets(results: dict):
+    rng = np.random.default_rng(SEED)
+    azimuths = rng.uniform(0, 360, 1000)
+    elevations = rng.uniform(0, 90, 1000)
+
+    def encode():
+        for az, el in zip(azimuths, elevations):
+            encode_packet(azimuth_command(az), 0x01)
+            encode_packet(elevation_command(el), 0x01)
+
+    results["ptz.encode_angle_pair_x1000"] = bench(encode, repeat=5)
+
+    # 发到本机一个只收不回的 UDP socket
+    sink = socket(AF_INET, SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.setblocking(False)
+    sock = socket(AF_INET, SOCK_DGRAM)
+    commands = [azimuth_command(az) for az in azimuths]
+
+    def send():
+        for command_data in commands:
+            send_command(sock, sink.getsockname(), command_data, 0x01)
+        try:
+            while True:
+                sink.recv(64)
+        except BlockingIOError:
+            pass
+
+    results["ptz.send_command_x1000"] = bench(send, repeat=5)
+    sock.close()
+    sink.close()
+
+
+def bench_sig(results: dict):
+    np.random.seed(SEED)
+    up_chirp, _ = gen_up_chirp(SAMP_RATE, SF, BW)
+    symbols = np.random.randint(0, 2**SF, 256)
+    frames = gen_symbols(up_chirp, SF, symbols).ravel()
+    sig = frames.astype(np.complex64)
+    samp_rate = SAMP_RATE
+
+    results["sig.gen_up_chirp"] = bench(lambda: gen_up_chirp(SAMP_RATE, SF, BW), repeat=10, number=10)
+    results["sig.gen_preamble_8"] = bench(lambda: gen_preamble(SAMP_RATE, SF, BW, 8), repeat=10)
+    results["sig.gen_symbols_256"] = bench(lambda: gen_symbols(up_chirp, SF, symbols), repeat=10)
+
+    def noise():
+        np.random.seed(SEED)
+        add_noise(0, sig, silent=True)
+
+    results[f"sig.add_noise_{sig.size}"] = bench(noise, repeat=5)
+    results[f"sig.slicing_{sig.size}"] = bench(lambda: slicing(sig, up_chirp.size), repeat=5)
+    results[f"sig.fft_hann_{sig.size}"] = bench(lambda: np.fft.fft(sig * np.hanning(sig.size)), repeat=5)
+    results[f"sig.welch_psd_{sig.size}"] = bench(lambda: welch_psd(sig, samp_rate), repeat=5)
+    results[f"sig.spectrogram_{sig.size}"] = bench(lambda: spectrogram(sig, samp_rate, 1024, 2000), repeat=5)
+    with tempfile.TemporaryDirectory() as tmp:
+        results[f"sig.fast_analysis_{sig.size}"] = bench(
+            lambda: fast_analysis(sig, samp_rate, tmp, render=False), repeat=3
+        )
+
+
+SUITES = {
+    "pass_search": bench_pass_search,
+    "pass_sampling": bench_pass_sampling,
+    "ptz": bench_ptz_packets,
+    "sig": bench_sig,
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=dirname(abspath(__file__)), capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"{'benchmark':<55} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<55} {'-':>12} {stats['median'] * 1e3:>10.3f}ms {'new':>8}")
+            continue
+        ratio = stats["median"] / old["median"]
+        print(f"{name:<55} {old['median'] * 1e3:>10.3f}ms {stats['median'] * 1e3:>10.3f}ms {ratio:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for pass prediction, PTZ packets and signal processing")
+    parser.add_argument("-k", nargs="*", choices=list(SUITES), default=list(SUITES), help="只运行这些测试组")
+    parser.add_argument("-o", "--output", default=None, help="结果 JSON 路径，默认 data/benchmark/<时间>_<提交>.json")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比(按中位数)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)  # 被测函数里的 INFO 日志不计入耗时
+    revision = git_revision()
+    results = {}
+    for name in args.k:
+        started = time.perf_counter()
+        SUITES[name](results)
+        print(f"{name}: {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+    report = {
+        "revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": SEED,
+        "tle": os.path.relpath(TLE_FIXTURE, data_dir),
+        "start_time": START_TIME.isoformat(),
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(join(data_dir, "benchmark"), exist_ok=True)
+        output = join(data_dir, "benchmark", f"{datetime.now():%Y%m%dT%H%M%S}_{revision}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(results)} results to {output}", file=sys.stderr)
+    if args.compare:
+        compare(report, args.compare)
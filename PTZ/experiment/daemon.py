@@ -0,0 +1,416 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import join
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from skyfield.api import load
+
+import ground_station as gs
+from utils.instrument import NULL_PROFILER, AckStats, TickProfiler
+from utils.logger import enable_async_logging, logger
+from utils.pass_plan import PassPlan
+from utils.pass_store import PassStore
+from utils.ptz_command import init_udp_connection, set_angle_position
+from utils.ptz_sim import PTZSimulator
+from utils.rate_track import track_pass_rate
+from utils.scheduler import TickScheduler
+from utils.tracking_log import TrackingRecorder
+
+# 常驻地面站进程：时间尺度、TLE、过境表、云台 socket 和遥测轮询在启动时建立一次，
+# 之后一直保持。新的 TLE 出现时自动重新规划；本地 HTTP 接口接受查询和控制命令：
+#   GET  /status              当前状态(是否在跟踪、进度、TLE 历元、最新遥测)
+#   GET  /passes?n=5          接下来的过境
+#   POST /track               立即跟踪正在进行或下一次的过境
+#   POST /stop                停止当前跟踪
+#   POST /replan              重新读取 TLE 并重新规划
+# 例: curl -s localhost:8765/passes?n=3 ; curl -s -X POST localhost:8765/track
+
+api_host = "127.0.0.1"
+api_port = 8765
+plan_hours = 48 # 过境表覆盖的时长，单位小时
+tle_check_period = 60.0 # 检查本地 TLE 文件是否更新的周期，单位秒
+tle_download_period = 6 * 3600.0 # 重新下载 TLE 的周期，单位秒，0为不下载
+auto_track = True # 是否在每次过境前自动开始跟踪
+prepare_lead = 60.0 # 过境开始前多少秒转到升起位置
+
+
+def find_passes(satellite, observer_location, start: datetime, hours: float, min_elevation: float) -> list[dict]:
+    # 从 start 前 30 分钟开始搜索，保证正在进行的过境也带着升起时间
+    t0 = gs.ts.from_datetime(start - timedelta(minutes=30))
+    t1 = gs.ts.from_datetime(start + timedelta(hours=hours))
+    t, events = satellite.find_events(observer_location, t0, t1, altitude_degrees=0.0)
+    difference = satellite - observer_location
+    passes = []
+    rise = culminate = None
+    max_elevation = -90.0
+    for ti, event in zip(t, events):
+        if event == 0:
+            rise, culminate, max_elevation = ti.utc_datetime(), None, -90.0
+        elif event == 1 and rise is not None:
+            elevation = difference.at(ti).altaz()[0].degrees
+            if elevation > max_elevation:
+                culminate, max_elevation = ti.utc_datetime(), elevation
+        elif event == 2 and rise is not None:
+            set_time = ti.utc_datetime()
+            if max_elevation > min_elevation and set_time > start:
+                passes.append(
+                    {"rise": rise, "culminate": culminate, "set": set_time, "max_elevation": float(max_elevation)}
+                )
+            rise = None
+    return passes
+
+
+def sample_pass(satellite, observer_location, p: dict, tick_time: int) -> PassPlan:
+    # 一次 skyfield 向量化计算整次过境的采样点
+    rise = p["rise"]
+    num_samples = int((p["set"] - rise).total_seconds() * 1000) // tick_time + 1
+    seconds = rise.second + rise.microsecond / 1e6 + np.arange(num_samples) * (tick_time / 1000.0)
+    times = gs.ts.utc(rise.year, rise.month, rise.day, rise.hour, rise.minute, seconds)
+    altitudes, azimuths, _ = (satellite - observer_location).at(times).altaz()
+    return PassPlan(rise, tick_time, altitudes.degrees, azimuths.degrees, p["max_elevation"])
+
+
+def latest_tle(noard_id) -> str | None:
+    files = sorted(glob.glob(join(gs.data_dir, "tle", f"{noard_id}", "*", "*.tle")))
+    return files[-1] if files else None
+
+
+def _pass_json(p: dict) -> dict:
+    return {
+        "rise": p["rise"].isoformat(),
+        "culminate": p["culminate"].isoformat() if p["culminate"] else None,
+        "set": p["set"].isoformat(),
+        "max_elevation": round(p["max_elevation"], 2),
+    }
+
+
+class GroundStationDaemon:
+    """
+    Warm ground-station state behind a local HTTP API.
+
+    The satellite, the pass table, the PTZ socket and the telemetry poller
+    are created once; a planner thread reloads the TLE when a newer element
+    set appears and starts tracking ahead of each pass (auto_track), and
+    track()/stop() can be called at any time from the API.
+    """
+
+    def __init__(self, tle_path=None, noard_id=gs.NOARD_ID):
+        self.noard_id = noard_id
+        self.fixed_tle = tle_path
+        self.tle_path = None
+        self.tle_mtime = None
+        self.satellite = None
+        self.passes = []
+        self.planned_until = None  # 过境表覆盖到的时间
+        self.store = PassStore(gs.pass_store_dir) if gs.pass_store_dir is not None else None
+        self._lock = threading.RLock()
+        self._cancel = threading.Event()  # 每次跟踪一个新的，stop() 置位
+        self._track_thread = None
+        self._scheduler = None
+        self._plan = None
+        self._tracked = set()  # 已跟踪过的过境(升起时间)
+        self._last_download = 0.0
+        self.last_result = None
+
+        self.sock, self.ptz_addr = init_udp_connection(gs.ip, gs.port, gs.local_ip, gs.local_port)
+        # 共用 socket 时接收由遥测的 ReplyRouter 负责，跟踪只用 track_sock
+        self.poller, self.track_sock = gs.start_telemetry(self.sock, self.ptz_addr)
+        self.refresh_tle(force=True)
+
+    # ---- 规划 ----
+    def refresh_tle(self, force=False) -> bool:
+        # 有新的 TLE 文件(或同一文件被更新)时重新读入并重新规划，返回是否重新规划
+        if self.fixed_tle is None and tle_download_period > 0 and time.time() - self._last_download > tle_download_period:
+            self._last_download = time.time()
+            try:
+                gs.download_tle(self.noard_id, force=True)
+            except Exception as e:
+                logger.warning(f"TLE download failed, keeping {self.tle_path!r}: {e}")
+        path = self.fixed_tle or latest_tle(self.noard_id)
+        if path is None:
+            logger.error(f"No TLE for {self.noard_id} under {gs.data_dir!r}")
+            return False
+        mtime = os.stat(path).st_mtime_ns
+        if not force and path == self.tle_path and mtime == self.tle_mtime:
+            return False
+        satellite = load.tle_file(path)[0]
+        with self._lock:
+            if not force and self.satellite is not None and satellite.epoch.tt == self.satellite.epoch.tt:
+                self.tle_path, self.tle_mtime = path, mtime
+                return False
+            self.satellite, self.tle_path, self.tle_mtime = satellite, path, mtime
+        logger.info(f"Loaded TLE {path!r} (epoch {satellite.epoch.utc_jpl()})")
+        self.replan()
+        return True
+
+    def replan(self, now: datetime | None = None):
+        now = now or datetime.now(timezone.utc)
+        started = time.perf_counter()
+        passes = find_passes(self.satellite, gs.Shanghai_location, now, plan_hours, gs.elevation_judge)
+        with self._lock:
+            self.passes = passes
+            self.planned_until = now + timedelta(hours=plan_hours)
+        logger.info(f"Planned {len(passes)} passes over {plan_hours} h in {time.perf_counter() - started:.2f} s")
+
+    def replan_due(self, now: datetime) -> bool:
+        # 过境表只剩不到一半时长时顺延，与表里有没有过境无关
+        return self.planned_until is None or self.planned_until - now < timedelta(hours=plan_hours / 2)
+
+    def next_passes(self, n=5) -> list[dict]:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            return [p for p in self.passes if p["set"] > now][:n]
+
+    # ---- 跟踪 ----
+    @property
+    def tracking(self) -> bool:
+        return self._track_thread is not None and self._track_thread.is_alive()
+
+    def track(self, p: dict | None = None) -> dict:
+        # 跟踪给定的过境，默认为正在进行或下一次的过境
+        with self._lock:
+            if self.tracking:
+                raise RuntimeError("Already tracking a pass")
+            if p is None:
+                upcoming = self.next_passes(1)
+                if not upcoming:
+                    raise RuntimeError("No upcoming pass")
+                p = upcoming[0]
+            self._tracked.add(p["rise"])
+            self._cancel = threading.Event()
+            self._track_thread = threading.Thread(
+                target=self._track, args=(p, self._cancel), name="tracking", daemon=True
+            )
+            self._track_thread.start()
+        return p
+
+    def stop(self) -> bool:
+        # 结束等待或正在进行的跟踪；_track 在锁内登记调度器并检查取消标志，所以不会漏掉
+        with self._lock:
+            self._cancel.set()
+            scheduler, thread = self._scheduler, self._track_thread
+        if scheduler is not None:
+            scheduler.cancel()
+        if thread is not None:
+            thread.join(timeout=5.0)
+        return thread is not None and not thread.is_alive()
+
+    def _track(self, p: dict, cancel: threading.Event):
+        plan = sample_pass(self.satellite, gs.Shanghai_location, p, gs.tick_time)
+        now = time.time()
+        if now > plan.t0:
+            # 过境已经开始：从当前时刻对应的采样点开始
+            i = plan.index_at(now) + 1
+            if i >= len(plan):
+                logger.warning(f"Pass {plan.rise_time} is already over")
+                self._plan = None
+                return
+            rise = datetime.fromtimestamp(plan.times[i], timezone.utc)
+            plan = PassPlan(rise, plan.tick_time, plan.elevations[i:], plan.azimuths[i:], plan.max_elevation)
+        self._plan = plan
+        set_angle_position(self.track_sock, self.ptz_addr, gs.add, plan.elevations[0], plan.azimuths[0] - gs.azimuth_ptz)
+        logger.info(f"Waiting for pass at {plan.rise_time} (max elevation {plan.max_elevation:.1f}°)")
+        if cancel.wait(max(0.0, plan.t0 - time.time())):
+            logger.info("Tracking cancelled before rise")
+            self._plan = None
+            return
+
+        recorder = TrackingRecorder(plan, gs.readback_period, gs.azimuth_ptz) if gs.readback_period > 0 else None
+        readback_every = max(1, round(gs.readback_period * 1000 / gs.tick_time))
+        profiler = TickProfiler(len(plan)) if gs.profile_ticks else NULL_PROFILER
+        scheduler = TickScheduler(
+            gs.tick_time / 1000.0, len(plan), gs.tick_spin, gs.tick_policy, gs.tick_cpu, gs.tick_priority
+        )
+        acks = AckStats()
+        packets = None
+        with self._lock:
+            self._scheduler = scheduler
+            if cancel.is_set():
+                scheduler.cancel()
+        logger.info(f"Tracking pass {plan.rise_time} ({gs.tracking_mode} mode)")
+        try:
+            if gs.tracking_mode == "rate":
+                packets = track_pass_rate(
+                    self.track_sock,
+                    self.ptz_addr,
+                    gs.add,
+                    plan,
+                    gs.azimuth_ptz,
+                    correction_period=gs.rate_correction_period,
+                    recorder=recorder,
+                    profiler=profiler,
+                    scheduler=scheduler,
+                    acks=acks,
+                )
+            else:
+                gs.track_pass_position(
+                    self.track_sock, self.ptz_addr, plan, recorder, readback_every, profiler, scheduler, acks
+                )
+        finally:
+            scheduler.log_summary()
+            row = None
+            if self.store is not None:
+                row = self.store.save_pass(
+                    plan,
+                    self.noard_id,
+                    recorder,
+                    profiler if gs.profile_ticks else None,
+                    scheduler,
+                    self.poller.records.snapshot(),
+                    acks=acks,
+                    packets=packets,
+                    tracking_mode=gs.tracking_mode,
+                    tle=os.path.relpath(self.tle_path, gs.data_dir),
+                    source="daemon",
+                )
+            self.last_result = row or scheduler.summary()
+            self._scheduler = None
+            self._plan = None
+
+    def status(self) -> dict:
+        plan, scheduler = self._plan, self._scheduler
+        telemetry = self.poller.latest()
+        upcoming = self.next_passes(1)
+        return {
+            "tracking": self.tracking,
+            "pass": {
+                "rise": plan.rise_time.isoformat(),
+                "max_elevation": plan.max_elevation,
+                "progress": (scheduler.released / len(plan)) if scheduler is not None else 0.0,
+            }
+            if plan is not None
+            else None,
+            "next_pass": _pass_json(upcoming[0]) if upcoming else None,
+            "tle": self.tle_path,
+            "tle_epoch": self.satellite.epoch.utc_iso() if self.satellite is not None else None,
+            "passes_planned": len(self.passes),
+            "telemetry": telemetry.as_dict() if telemetry is not None else None,
+            "last_result": self.last_result,
+        }
+
+    # ---- 主循环 ----
+    def _planner(self, stop_event: threading.Event):
+        last_check = time.monotonic()
+        while not stop_event.wait(1.0):
+            if time.monotonic() - last_check > tle_check_period:
+                last_check = time.monotonic()
+                try:
+                    self.refresh_tle()
+                except Exception as e:
+                    logger.error(f"Re-planning failed: {e}")
+            if not auto_track or self.tracking:
+                continue
+            upcoming = self.next_passes(1)
+            if upcoming and upcoming[0]["rise"] not in self._tracked:
+                lead = (upcoming[0]["rise"] - datetime.now(timezone.utc)).total_seconds()
+                if lead < prepare_lead:
+                    # /track 可能在检查之后抢先开始了跟踪，出错只记录，规划线程不能退出
+                    try:
+                        self.track(upcoming[0])
+                    except Exception as e:
+                        logger.error(f"Auto-tracking failed: {e}")
+            # 过境表快用完时顺延
+            now = datetime.now(timezone.utc)
+            if self.satellite is not None and self.replan_due(now):
+                try:
+                    self.replan(now)
+                except Exception as e:
+                    logger.error(f"Re-planning failed: {e}")
+
+    def serve(self, host=api_host, port=api_port):
+        stop_event = threading.Event()
+        planner = threading.Thread(target=self._planner, args=(stop_event,), name="planner", daemon=True)
+        planner.start()
+        server = ThreadingHTTPServer((host, port), _make_handler(self))
+        logger.info(f"Ground station daemon listening on http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop_event.set()
+            self.stop()
+            server.server_close()
+            self.poller.close()
+            self.sock.close()
+
+
+def _make_handler(daemon: GroundStationDaemon):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body):
+            data = json.dumps(body, ensure_ascii=False, default=str).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/status":
+                self._reply(200, daemon.status())
+            elif url.path == "/passes":
+                try:
+                    n = int(query.get("n", ["5"])[0])
+                    if n < 0:
+                        raise ValueError
+                except ValueError:
+                    self._reply(400, {"error": f"n must be a non-negative integer, got {query['n'][0]!r}"})
+                    return
+                self._reply(200, [_pass_json(p) for p in daemon.next_passes(n)])
+            else:
+                self._reply(404, {"error": f"unknown path {url.path}"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                if url.path == "/track":
+                    self._reply(200, {"tracking": _pass_json(daemon.track())})
+                elif url.path == "/stop":
+                    self._reply(200, {"stopped": daemon.stop()})
+                elif url.path == "/replan":
+                    daemon.refresh_tle(force=True)
+                    self._reply(200, {"passes": len(daemon.passes), "tle": daemon.tle_path})
+                else:
+                    self._reply(404, {"error": f"unknown path {url.path}"})
+            except RuntimeError as e:
+                self._reply(409, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-running ground station with a local HTTP control API")
+    parser.add_argument("--sim", action="store_true", help="连接本地云台模拟器而不是真实云台")
+    parser.add_argument("--tle", default=None, help="固定使用该TLE文件(仍会在文件更新时重新规划)")
+    parser.add_argument("--host", default=api_host)
+    parser.add_argument("--port", type=int, default=api_port)
+    parser.add_argument("--mode", choices=["position", "rate"], default=gs.tracking_mode, help="跟踪模式")
+    parser.add_argument("--no-auto", action="store_true", help="不自动跟踪，只响应 /track")
+    args = parser.parse_args()
+    gs.tracking_mode = args.mode
+    auto_track = not args.no_auto
+
+    sim = None
+    if args.sim:
+        sim = PTZSimulator(port=0).start()
+        gs.ip, gs.port = sim.addr
+        gs.local_ip, gs.local_port = "127.0.0.1", 0
+    if gs.async_logging:
+        enable_async_logging(gs.packet_log_rate)
+    try:
+        GroundStationDaemon(args.tle).serve(args.host, args.port)
+    finally:
+        if sim is not None:
+            sim.stop()
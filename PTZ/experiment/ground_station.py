@@ -4,16 +4,31 @@ from os.path import abspath, dirname, join
 import numpy as np
 import matplotlib.pyplot as plt
 from skyfield.api import load, EarthSatellite, wgs84
-from utils.logger import logger
-from utils.ptz_command import init_udp_connection, full_self_check, query_temperature, direction_control, query_work_mode, query_work_status, set_angle_position
+from utils.logger import logger, enable_async_logging, add_file_sink, remove_file_sink
+from utils.ptz_command import init_udp_connection, full_self_check, query_temperature, direction_control, query_work_mode, query_work_status, set_angle_position, query_angle_position
+from utils.telemetry import TelemetryPoller
+from utils.ptz_sim import PTZSimulator
+from utils.pass_plan import PassPlan
+from utils.tracking_log import TrackingRecorder
+from utils.rate_track import track_pass_rate
+from utils.multi_ptz import MultiPTZController
+from utils.instrument import TickProfiler, NULL_PROFILER, AckStats
+from utils.scheduler import TickScheduler
+from utils.pass_store import PassStore
+import asyncio
 from skyfield import timelib
 import requests
 import arrow
 from socket import *
 import time
 import binascii
+import argparse
 
 
+#文档位置
+parent_dir = dirname(dirname(abspath(__file__)))
+data_dir = join(parent_dir,"data")
+
 # 起始位置和姿态（默认起始向北，仰角0度）
 Shanghai_location = wgs84.latlon(31.1343, 121.2829)  # 31°13′43″N 121°28′29″E
 azimuth_ptz = 0 # 初始云台北向顺时针多少度
@@ -26,32 +41,57 @@ NOARD_ID = 60745 # SX-1
 ip= '192.168.8.200'
 port= 6666
 add = 0x01  #云台独特地址
+# 多云台配置 [(名称, ip, port, 云台地址, 初始云台北向顺时针多少度), ...]，供 main_multi 使用；
+# None 为只用上面的单台云台(ip, port, add, azimuth_ptz)，在运行时才取值，--sim 的修改也会生效
+ptz_list = None
 
 # 主机参数
 local_ip = '192.168.8.222' # 监听所有本地接口
 local_port = 139       # 本地绑定的端口
+telemetry_port = None  # 遥测轮询使用的本地端口；None为和跟踪共用 local_port 上的 socket，回包按类型分流(云台回包发到固定本地端口时必须如此)，0为任意空闲端口(要求云台按来源端口回包)
 
 # 其他参数
 ts = load.timescale()
 tick_time=200 # 采样周期，单位毫秒
 n= 1 # 循环次数
 elevation_judge = 60 # 仰角阈值
-
-def download_tle(noard_id) -> str: # 下载tle文件
-    url = f"http://celestrak.org/NORAD/elements/gp.php?CATNR={noard_id}"
-    response = requests.get(url)
-    html_content = response.text
+telemetry_period = 5.0 # 遥测轮询周期，单位秒
+readback_period = 1.0 # 角度回读周期，单位秒，0为关闭闭环测量
+tracking_mode = "position" # "position": 每个采样周期下发绝对角度; "rate": 按角速度下发方向控制速度指令
+rate_correction_period = 10.0 # 速度模式下回读角度、修正漂移的周期，单位秒
+async_logging = True # 日志放到后台线程输出，跟踪循环只负责入队
+packet_log_rate = 5.0 # 逐包报文日志每秒最多输出条数，None为不限流
+pass_log = True # 每次过境的完整日志写入 pass_<升起时间>.log
+tick_spin = 0.002 # 截止时间前忙等的时长，单位秒，0为只用sleep
+tick_policy = "skip" # 超时策略: "skip" 跳到当前应执行的点; "catchup" 连续补发错过的点; "stretch" 整体顺延
+tick_cpu = None # 跟踪进程绑定的CPU核，None为不绑定
+tick_priority = None # Linux SCHED_FIFO 实时优先级(1-99，需要root或CAP_SYS_NICE)，None为不修改
+pass_store_dir = join(data_dir, "passes") # 过境记录库目录(每次过境一个 .npz + index.jsonl)，None为不保存
+profile_ticks = True # 是否记录每个采样周期各阶段(星历/编码/发送/回包/回读/睡眠误差)的耗时
+
+def download_tle(noard_id, force=False) -> str: # 下载tle文件；force=True 时不用当天缓存，内容有变化才另存新文件
     utc = arrow.utcnow()
     today = utc.format("YYYY-MM-DD")
     # unix_timestamp = utc.timestamp()
     tle_dir = join(data_dir, "tle", f"{noard_id}", today)
     os.makedirs(tle_dir, exist_ok=True)
-    files = os.listdir(tle_dir)
-    for file in files:
-        if file == f"{today}.tle":
-            logger.info(f"TLE cache found: {join(tle_dir, file)!r}")
-            return join(tle_dir, file)
-    tle_path = join(tle_dir, f"{today}.tle")
+    # 当天较新的文件名是 {today}T{时分秒}.tle，排序在 {today}.tle 之后
+    files = sorted(file for file in os.listdir(tle_dir) if file.endswith(".tle"))
+    if files and not force:
+        logger.info(f"TLE cache found: {join(tle_dir, files[-1])!r}")
+        return join(tle_dir, files[-1])
+    url = f"http://celestrak.org/NORAD/elements/gp.php?CATNR={noard_id}"
+    response = requests.get(url)
+    response.raise_for_status()
+    html_content = response.text
+    if files:
+        with open(join(tle_dir, files[-1])) as f:
+            if f.read() == html_content:
+                logger.info(f"TLE unchanged: {join(tle_dir, files[-1])!r}")
+                return join(tle_dir, files[-1])
+        tle_path = join(tle_dir, f"{utc.format('YYYY-MM-DDTHHmmss')}.tle")
+    else:
+        tle_path = join(tle_dir, f"{today}.tle")
     with open(tle_path, "w") as html_file:
         html_file.write(html_content)
     logger.info(f"Downloaded TLE to {tle_path!r}")
@@ -151,12 +191,13 @@ def get_satellite_position(tle_path, observer_location, tick_time): # 获得卫
     print("No pass events in the next 24 hours.")
     return None, None, None
 
-def get_satellite_position_angle(tle_path, observer_location, tick_time, elevation_judge): # 获得卫星轨迹
+def get_satellite_position_angle(tle_path, observer_location, tick_time, elevation_judge, start_time=None, plot=True): # 获得卫星轨迹
     # Load satellite data
     satellite = load.tle_file(tle_path)[0]
     
-    # Get current UTC time
-    start_time = datetime.now(timezone.utc)
+    # Get current UTC time (or the given start time, for replaying old TLEs)
+    if start_time is None:
+        start_time = datetime.now(timezone.utc)
     logger.info(f"The current time is {start_time}")
 
     # Find the next pass event
@@ -201,36 +242,37 @@ def get_satellite_position_angle(tle_path, observer_location, tick_time, elevati
                 az_array = azimuths.degrees
 
                 # print_picture
-                altaz_dir = dirname(tle_path)
-                altaz_dir = join(altaz_dir,f"judge_{elevation_judge}")
-                os.makedirs(altaz_dir, exist_ok=True)
-                plt.figure(figsize=(10, 6))
-                plt.plot(time_idxs, alt_array, label=f"Elevation ({max_altitude_degrees})")
-                plt.xlabel("Time (UTC)")
-                plt.ylabel("Elevation (degrees)")
-                plt.grid(True)
-                plt.legend()
-                plt.savefig(join(altaz_dir, f"time_elevation_{elevation_judge}.png"))
-                plt.close()
-
-                plt.figure(figsize=(10, 6))
-                plt.plot(time_idxs, az_array, label=f"Elevation Rate ({max_altitude_degrees})", color='r')
-                plt.xlabel("Time (UTC)")
-                plt.ylabel("Elevation Rate (degrees per second)")
-                plt.grid(True)
-                plt.legend()
-                plt.savefig(join(altaz_dir, f"azimuth_{elevation_judge}.png"))
-                plt.close()
+                if plot:
+                    altaz_dir = dirname(tle_path)
+                    altaz_dir = join(altaz_dir,f"judge_{elevation_judge}")
+                    os.makedirs(altaz_dir, exist_ok=True)
+                    plt.figure(figsize=(10, 6))
+                    plt.plot(time_idxs, alt_array, label=f"Elevation ({max_altitude_degrees})")
+                    plt.xlabel("Time (UTC)")
+                    plt.ylabel("Elevation (degrees)")
+                    plt.grid(True)
+                    plt.legend()
+                    plt.savefig(join(altaz_dir, f"time_elevation_{elevation_judge}.png"))
+                    plt.close()
+
+                    plt.figure(figsize=(10, 6))
+                    plt.plot(time_idxs, az_array, label=f"Elevation Rate ({max_altitude_degrees})", color='r')
+                    plt.xlabel("Time (UTC)")
+                    plt.ylabel("Elevation Rate (degrees per second)")
+                    plt.grid(True)
+                    plt.legend()
+                    plt.savefig(join(altaz_dir, f"azimuth_{elevation_judge}.png"))
+                    plt.close()
                 
-                plt.figure(figsize=(10, 6))
-                ax = plt.subplot(111, polar=True)
-                ax.plot(np.radians(az_array), 90 - alt_array, marker='o', linestyle='-')
-                ax.set_theta_zero_location('N')  # Set 0 degrees to North
-                ax.set_theta_direction(-1)  # Set direction to clockwise
-                plt.title('Satellite Sky Path During Pass')
-                plt.grid(True)
-                plt.savefig(join(altaz_dir, f"sky_track_{elevation_judge}.png"))
-                plt.close()
+                    plt.figure(figsize=(10, 6))
+                    ax = plt.subplot(111, polar=True)
+                    ax.plot(np.radians(az_array), 90 - alt_array, marker='o', linestyle='-')
+                    ax.set_theta_zero_location('N')  # Set 0 degrees to North
+                    ax.set_theta_direction(-1)  # Set direction to clockwise
+                    plt.title('Satellite Sky Path During Pass')
+                    plt.grid(True)
+                    plt.savefig(join(altaz_dir, f"sky_track_{elevation_judge}.png"))
+                    plt.close()
                 
                 return alt_array, az_array, rise_time
     
@@ -238,9 +280,45 @@ def get_satellite_position_angle(tle_path, observer_location, tick_time, elevati
     return None, None, None
 
 
-def main():   
+def start_telemetry(sock, ptz_addr): # 按 telemetry_port 共用跟踪 socket 或单独开一个，返回 (poller, 跟踪循环使用的 socket)
+    if telemetry_port is None:
+        poller = TelemetryPoller(ptz_addr, add, period=telemetry_period, share=sock).start()
+        return poller, poller.tracking_sock
+    return TelemetryPoller(ptz_addr, add, local_ip, telemetry_port, telemetry_period).start(), sock
+
+
+def track_pass_position(sock, ptz_addr, plan, recorder=None, readback_every=1, profiler=NULL_PROFILER, scheduler=None, acks=None): # 按采样周期逐点下发绝对角度，acks 统计定位命令的确认
+    elevations, azimuths = plan.elevations, plan.azimuths
+    if scheduler is None:
+        scheduler = TickScheduler(plan.tick_time / 1000.0, len(plan))
+
+    # 按单调时钟的绝对截止时间逐个 tick 执行，超时按 scheduler 的策略处理
+    for i in scheduler:
+        t = profiler.begin_tick()
+        profiler.add("sleep_overshoot", scheduler.last_lateness_ns)
+        # 获取当前时刻应追踪的角度
+        current_azimuth = azimuths[i] - azimuth_ptz
+        current_elevation = elevations[i]
+        profiler.lap("ephemeris", t)
+
+        # 调用 set_angle_position 函数来设定新的角度
+        set_angle_position(sock, ptz_addr, add, current_elevation, current_azimuth, message=True, profiler=profiler, acks=acks)
+
+        # 按回读周期查询云台实际角度，时间戳换算到过境计划的时间轴上
+        if recorder is not None and i % readback_every == 0:
+            t = profiler.now()
+            actual = query_angle_position(sock, ptz_addr, add)
+            if actual is not None:
+                recorder.add(plan.t0 + scheduler.elapsed(), *actual)
+            profiler.lap("readback", t)
+
+
+def main(tle_path=None, start_time=None):
     # 读取tle文件并更新
-    tle_path = download_tle(NOARD_ID)
+    if tle_path is None:
+        tle_path = download_tle(NOARD_ID)
+    if async_logging:
+        enable_async_logging(packet_log_rate)
     
     # 采集最近的N次过境数据
     for i in range(n):
@@ -248,7 +326,7 @@ def main():
         # elevations, azimuths, rise_time = get_satellite_position(tle_path, Shanghai_location, tick_time)
         # 读取现在时间，寻找最近一次大于n度的过境事件
         
-        elevations, azimuths, rise_time = get_satellite_position_angle(tle_path, Shanghai_location, tick_time, elevation_judge)
+        elevations, azimuths, rise_time = get_satellite_position_angle(tle_path, Shanghai_location, tick_time, elevation_judge, start_time)
         
         # 连接云台，读取工作模式和工作状态，并对准卫星到达的初始角度
         if elevations is not None and azimuths is not None:
@@ -257,10 +335,19 @@ def main():
             query_work_mode(sock, ptz_addr, add)
             query_work_status(sock, ptz_addr, add)
             # full_self_check(sock, address, add)
+            poller, sock = start_telemetry(sock, ptz_addr) # 之后跟踪只用返回的 socket
         else:
             logger.error("No pass events in the next 24 hours.")
             return
         
+        plan = PassPlan(rise_time, tick_time, elevations, azimuths)
+        recorder = TrackingRecorder(plan, readback_period, azimuth_ptz) if readback_period > 0 else None
+        readback_every = max(1, round(readback_period * 1000 / tick_time))
+        profiler = TickProfiler(len(plan)) if profile_ticks else NULL_PROFILER
+        scheduler = TickScheduler(tick_time / 1000.0, len(plan), tick_spin, tick_policy, tick_cpu, tick_priority)
+        acks = AckStats()
+        log_sink = add_file_sink(join(dirname(tle_path), f"pass_{rise_time:%Y%m%dT%H%M%S}.log")) if pass_log else None
+
         # 开始控制云台，使云台指向卫星
         start_azimuth= azimuths[0] - azimuth_ptz
         start_elevation = elevations[0]
@@ -273,32 +360,96 @@ def main():
         #     time.sleep(0.1)  # 检查当前时间，使用较小的睡眠时间间隔以减少 CPU 占用并保持精确度
 
         # 按照采样周期开始跟踪卫星
-        logger.info("Starting to track the satellite...")
-        tracking_start_time = time.time()  # 记录跟踪的起始时间
-
-        for i in range(len(elevations)):
-            # 获取当前时刻应追踪的角度
-            current_azimuth = azimuths[i] - azimuth_ptz
-            current_elevation = elevations[i]
-
-            # 调用 set_angle_position 函数来设定新的角度
-            set_angle_position(sock, ptz_addr, add, current_elevation, current_azimuth, message=True)
-
-            # 确保每次执行都是在精确的 tick_time 间隔
-            next_time = tracking_start_time + (i + 1) * (tick_time / 1000.0)
-            current_time = time.time()
-            sleep_time = max(0, next_time - current_time)
-            if sleep_time > 0:
-                time.sleep(sleep_time)  # 保证时间间隔为 tick_time
+        logger.info(f"Starting to track the satellite ({tracking_mode} mode)...")
+        if tracking_mode == "rate":
+            packets = track_pass_rate(sock, ptz_addr, add, plan, azimuth_ptz, correction_period=rate_correction_period, recorder=recorder, profiler=profiler, scheduler=scheduler, acks=acks)
+        else:
+            track_pass_position(sock, ptz_addr, plan, recorder, readback_every, profiler, scheduler, acks)
+            packets = None # 位置模式每条定位命令都计入 acks
         
         logger.info("Finished tracking the satellite.")
+        scheduler.log_summary()
+        profiler.log_summary()
+        logger.info(f"Angle commands: {acks.summary()}")
+        if pass_store_dir is not None:
+            # 计划轨迹、回读角度、逐 tick 时序、命令确认统计和遥测存入过境记录库
+            PassStore(pass_store_dir).save_pass(
+                plan,
+                NOARD_ID,
+                recorder,
+                profiler if profile_ticks else None,
+                scheduler,
+                poller.records.snapshot(),
+                acks=acks,
+                packets=packets,
+                tracking_mode=tracking_mode,
+                tle=os.path.relpath(tle_path, data_dir),
+                log=os.path.relpath(log_sink.baseFilename, data_dir) if log_sink is not None else None,
+            )
+        else:
+            # 不用记录库时按原来的方式存在 TLE 目录下
+            poller.dump(join(dirname(tle_path), "telemetry.jsonl"))
+            if recorder is not None:
+                recorder.save(join(dirname(tle_path), f"tracking_{rise_time:%Y%m%dT%H%M%S}.npz"))
+            if profile_ticks:
+                profiler.save(join(dirname(tle_path), f"timing_{rise_time:%Y%m%dT%H%M%S}.npz"))
+        poller.close()
+        if log_sink is not None:
+            remove_file_sink(log_sink)
     
     return
 
 
+def get_ptz_list() -> list[tuple]:
+    return ptz_list if ptz_list is not None else [("ptz1", ip, port, add, azimuth_ptz)]
+
+
+def main_multi(tle_path=None, start_time=None, wait_for_rise=True): # 一个事件循环同时控制 ptz_list 中的所有云台
+    if tle_path is None:
+        tle_path = download_tle(NOARD_ID)
+    elevations, azimuths, rise_time = get_satellite_position_angle(tle_path, Shanghai_location, tick_time, elevation_judge, start_time)
+    if elevations is None:
+        logger.error("No pass events in the next 24 hours.")
+        return
+    controller = MultiPTZController(local_ip, local_port)
+    for name, ptz_ip, ptz_port, ptz_add, ptz_azimuth in get_ptz_list():
+        controller.add_gimbal(name, ptz_ip, ptz_port, ptz_add, PassPlan(rise_time, tick_time, elevations, azimuths), ptz_azimuth)
+    stats = asyncio.run(controller.run(wait_for_rise))
+    logger.info(f"Finished tracking with {len(stats)} gimbals: {stats}")
+    return stats
+
+
 if __name__ == "__main__":
-    #文档位置
-    parent_dir = dirname(dirname(abspath(__file__)))
-    data_dir = join(parent_dir,"data")    
-    
-    main()    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sim", action="store_true", help="连接本地云台模拟器(utils/ptz_sim.py)而不是真实云台")
+    parser.add_argument("--tle", default=None, help="使用本地TLE文件，不下载")
+    parser.add_argument("--start", default=None, help="从该时间(ISO格式，不带时区按UTC)开始寻找过境，默认为当前时间")
+    parser.add_argument("--mode", choices=["position", "rate"], default=tracking_mode, help="跟踪模式")
+    parser.add_argument("--multi", action="store_true", help="用一个事件循环同时控制 ptz_list 中的所有云台(只支持位置模式)")
+    args = parser.parse_args()
+    start_time = datetime.fromisoformat(args.start) if args.start else None
+    if start_time is not None:
+        # 不带时区按 UTC，带时区(如 +08:00)时换算到 UTC
+        start_time = start_time.replace(tzinfo=timezone.utc) if start_time.tzinfo is None else start_time.astimezone(timezone.utc)
+    tracking_mode = args.mode
+
+    sims = {}
+    if args.sim:
+        if args.multi and ptz_list is not None:
+            # 每台配置的云台对应一个模拟器
+            sims = {entry[0]: PTZSimulator(port=0, add=entry[3], seed=k).start() for k, entry in enumerate(ptz_list)}
+            ptz_list = [(name, *sims[name].addr, ptz_add, ptz_azimuth) for name, _, _, ptz_add, ptz_azimuth in ptz_list]
+        else:
+            sims = {"ptz1": PTZSimulator(port=0).start()}
+            ip, port = sims["ptz1"].addr
+        local_ip, local_port = '127.0.0.1', 0
+
+    if args.multi:
+        main_multi(args.tle, start_time)
+    else:
+        main(args.tle, start_time)
+
+    for name, sim in sims.items():
+        sim.stop()
+        sim.save(join(data_dir, "ptz_sim.npz" if len(sims) == 1 else f"ptz_sim_{name}.npz"))
+        logger.info(f"Simulator {name} summary: {sim.summary()}")    
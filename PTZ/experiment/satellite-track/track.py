@@ -1,54 +1,291 @@
-import requests
-import arrow
+import argparse
+import csv
+import glob
+import json
 import os
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import requests
 from skyfield.api import load, wgs84
-from skyfield import timelib
 
 NOARD_ID = 57582
+NOARD_IDS = [NOARD_ID]  # 一次运行计算多颗卫星
 
 latitude = 31.077117
 longitude = 121.381141
 
-degrees = 5
+degrees = [5, 30, 60]  # 仰角阈值，每个阈值各算一套过境
+hours = 48  # 从现在起计算多长时间内的过境
+time_zone = "Asia/Shanghai"
+formats = ("csv", "json", "ics")
+
+FIELDS = (
+    "norad_id",
+    "name",
+    "mask",
+    "rise_utc",
+    "culminate_utc",
+    "set_utc",
+    "rise_local",
+    "culminate_local",
+    "set_local",
+    "max_elevation",
+    "duration_s",
+    "tle_epoch",
+)
+
+
+def fetch_tle(norad_id: int, tle_dir: str) -> str | None:
+    # 下载 TLE；内容和最近一次保存的相同时不另存新文件。下载失败时用最近一次的缓存
+    sat_dir = os.path.join(tle_dir, str(norad_id))
+    os.makedirs(sat_dir, exist_ok=True)
+    cached = sorted(glob.glob(os.path.join(sat_dir, "*.tle")))
+    try:
+        response = requests.get(f"http://celestrak.org/NORAD/elements/gp.php?CATNR={norad_id}", timeout=10)
+        response.raise_for_status()
+        content = response.text
+    except requests.RequestException as e:
+        print(f"{norad_id}: TLE download failed ({e}), using cached TLE")
+        return cached[-1] if cached else None
+    if cached:
+        with open(cached[-1]) as f:
+            if f.read() == content:
+                return cached[-1]
+    tle_path = os.path.join(sat_dir, f"{time.time()}.tle")
+    with open(tle_path, "w") as f:
+        f.write(content)
+    return tle_path
+
+
+def parse_utc(value: str) -> datetime:
+    # ISO 时间；不带时区时按 UTC，带时区(如 +08:00)时换算到 UTC
+    t = datetime.fromisoformat(value)
+    return t.replace(tzinfo=timezone.utc) if t.tzinfo is None else t.astimezone(timezone.utc)
+
+
+def unix_seconds(t) -> np.ndarray:
+    # skyfield Time -> unix 秒，用 UTC 日历分量向量化换算
+    year, month, day, hour, minute, second = t.utc
+    months = (year.astype(np.int64) - 1970) * 12 + month.astype(np.int64) - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + day.astype(np.int64) - 1
+    return days * 86400.0 + hour * 3600.0 + minute * 60.0 + second
+
+
+def to_local(unix: np.ndarray, tz: str) -> np.ndarray:
+    """
+    Format unix seconds as local ISO times ("YYYY-MM-DDTHH:MM:SS+08:00") in
+    bulk: one zoneinfo lookup per distinct hour instead of one per event.
+    """
+    unix = np.asarray(unix, dtype=np.float64)
+    if unix.size == 0:
+        return np.array([], dtype=str)
+    zone = ZoneInfo(tz)
+    hours_, inverse = np.unique(np.floor(unix / 3600.0).astype(np.int64), return_inverse=True)
+    offsets = np.array(
+        [datetime.fromtimestamp(h * 3600, timezone.utc).astimezone(zone).utcoffset().total_seconds() for h in hours_],
+        dtype=np.int64,
+    )[inverse]
+    local = (np.round(unix).astype(np.int64) + offsets).astype("datetime64[s]")
+    sign = np.where(offsets < 0, "-", "+")
+    off_h = np.char.zfill((np.abs(offsets) // 3600).astype(str), 2)
+    off_m = np.char.zfill((np.abs(offsets) % 3600 // 60).astype(str), 2)
+    return np.char.add(np.char.add(np.datetime_as_string(local, unit="s"), sign), np.char.add(np.char.add(off_h, ":"), off_m))
+
+
+def to_utc(unix: np.ndarray) -> np.ndarray:
+    return np.char.add(np.datetime_as_string(np.round(np.asarray(unix)).astype("datetime64[s]"), unit="s"), "Z")
+
+
+def compute_passes(satellite, place, ts, start: datetime, hours: float, masks, tz: str) -> list[dict]:
+    # 每个仰角阈值一次 find_events；所有最高点的仰角一次算完，时间一次性换算
+    t0 = ts.from_datetime(start)
+    t1 = ts.from_datetime(start + timedelta(hours=hours))
+    rise, culminate, set_, mask_of = [], [], [], []
+    for mask in masks:
+        t, events = satellite.find_events(place, t0, t1, altitude_degrees=mask)
+        tt = t.tt
+        i = 0
+        while i < len(events):
+            # 完整的 升起 -> 最高点(可能多个) -> 落下；窗口两端不完整的过境跳过
+            if events[i] != 0:
+                i += 1
+                continue
+            j = i + 1
+            while j < len(events) and events[j] == 1:
+                j += 1
+            if j < len(events) and events[j] == 2 and j > i + 1:
+                rise.append(tt[i])
+                culminate.append(tt[i + 1 : j])
+                set_.append(tt[j])
+                mask_of.append(mask)
+            i = j + 1 if j < len(events) and events[j] == 2 else j
+    if not rise:
+        return []
+    counts = [c.size for c in culminate]
+    all_culminate = ts.tt_jd(np.concatenate(culminate))
+    elevations = (satellite - place).at(all_culminate).altaz()[0].degrees
+    # 多个最高点时取仰角最大的一个
+    best = np.array([off + np.argmax(elevations[off : off + n]) for off, n in zip(np.cumsum([0] + counts[:-1]), counts)])
+    rise_unix = unix_seconds(ts.tt_jd(np.array(rise)))
+    set_unix = unix_seconds(ts.tt_jd(np.array(set_)))
+    culm_unix = unix_seconds(all_culminate)[best]
+
+    columns = {
+        "rise_utc": to_utc(rise_unix),
+        "culminate_utc": to_utc(culm_unix),
+        "set_utc": to_utc(set_unix),
+        "rise_local": to_local(rise_unix, tz),
+        "culminate_local": to_local(culm_unix, tz),
+        "set_local": to_local(set_unix, tz),
+    }
+    name = satellite.name or str(satellite.model.satnum)
+    epoch = satellite.epoch.utc_strftime("%Y-%m-%dT%H:%M:%SZ")
+    return [
+        {
+            "norad_id": int(satellite.model.satnum),
+            "name": name,
+            "mask": mask_of[k],
+            **{key: str(col[k]) for key, col in columns.items()},
+            "max_elevation": round(float(elevations[best[k]]), 2),
+            "duration_s": round(float(set_unix[k] - rise_unix[k]), 1),
+            "tle_epoch": epoch,
+            "_rise": float(rise_unix[k]),
+        }
+        for k in range(len(rise))
+    ]
+
+
+def merge(table: list[dict], new_rows: list[dict], replace_from: dict) -> list[dict]:
+    """
+    Merge freshly computed passes into the existing table.
+
+    For every satellite in `replace_from` (norad_id -> unix time) the old
+    rows from that time on are dropped, since the new element set
+    supersedes them; earlier rows are kept as history. Rows are then
+    deduplicated on (satellite, mask, rise minute) and sorted by rise time.
+    """
+    kept = [
+        row
+        for row in table
+        if row["norad_id"] not in replace_from or row["_rise"] < replace_from[row["norad_id"]]
+    ]
+    unique = {}
+    for row in kept + new_rows:
+        unique[(row["norad_id"], row["mask"], round(row["_rise"] / 60.0))] = row
+    return sorted(unique.values(), key=lambda r: (r["_rise"], r["norad_id"], r["mask"]))
+
+
+def read_table(path: str) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        row["norad_id"] = int(row["norad_id"])
+        row["mask"] = float(row["mask"]) if "." in row["mask"] else int(row["mask"])
+        row["max_elevation"] = float(row["max_elevation"])
+        row["duration_s"] = float(row["duration_s"])
+        row["_rise"] = datetime.fromisoformat(row["rise_utc"].replace("Z", "+00:00")).timestamp()
+    return rows
+
+
+def write_csv(path: str, rows: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(path: str, rows: list[dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{k: row[k] for k in FIELDS} for row in rows], f, ensure_ascii=False, indent=1)
+
+
+def write_ics(path: str, rows: list[dict]):
+    # 每次过境一个 VEVENT，时间用 UTC
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//satellite-track//passes//EN", "CALSCALE:GREGORIAN"]
+    for row in rows:
+        start = row["rise_utc"].replace("-", "").replace(":", "")
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{row['norad_id']}-{row['mask']}-{start}@satellite-track",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{start}",
+            f"DTEND:{row['set_utc'].replace('-', '').replace(':', '')}",
+            f"SUMMARY:{row['name']} >{row['mask']}° max {row['max_elevation']}°",
+            f"DESCRIPTION:NORAD {row['norad_id']}, culminate {row['culminate_local']}, TLE epoch {row['tle_epoch']}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\r\n".join(lines) + "\r\n")
+
+
+WRITERS = {"csv": write_csv, "json": write_json, "ics": write_ics}
+
 
 if __name__ == "__main__":
-    script_path = os.path.abspath(__file__)
-    script_dir = os.path.dirname(script_path)
+    parser = argparse.ArgumentParser(description="Merged pass table for several satellites and elevation masks")
+    parser.add_argument("--ids", type=int, nargs="+", default=NOARD_IDS, help="NORAD 编号")
+    parser.add_argument("--masks", type=float, nargs="+", default=degrees, help="仰角阈值(度)")
+    parser.add_argument("--hours", type=float, default=hours)
+    parser.add_argument("--tz", default=time_zone)
+    parser.add_argument("--formats", nargs="+", choices=list(WRITERS), default=list(formats))
+    parser.add_argument("--tle", nargs="*", default=None, help="使用这些本地 TLE 文件，不下载")
+    parser.add_argument("--start", default=None, help="从该时间(ISO格式，不带时区按UTC)开始计算，默认为当前时间")
+    args = parser.parse_args()
+    masks = [int(m) if float(m).is_integer() else m for m in args.masks]
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
     tle_dir = os.path.join(script_dir, "tle")
     events_dir = os.path.join(script_dir, "events")
     os.makedirs(tle_dir, exist_ok=True)
     os.makedirs(events_dir, exist_ok=True)
-
-    url = f"http://celestrak.org/NORAD/elements/gp.php?CATNR={NOARD_ID}"
-    response = requests.get(url)
-    html_content = response.text
-
-    utc = arrow.utcnow()
-    unix_timestamp = utc.timestamp()
-    tle_path = os.path.join(tle_dir, f"{unix_timestamp}.tle")
-    with open(tle_path, "w") as html_file:
-        html_file.write(html_content)
+    table_path = os.path.join(events_dir, "passes.csv")
+    state_path = os.path.join(events_dir, "state.json")
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
 
     ts = load.timescale()
     place = wgs84.latlon(latitude, longitude)
+    start = parse_utc(args.start) if args.start else datetime.now(timezone.utc)
+    tle_paths = args.tle if args.tle else [fetch_tle(norad_id, tle_dir) for norad_id in args.ids]
+
+    table = read_table(table_path)
+    new_rows, replace_from = [], {}
+    for tle_path in tle_paths:
+        if tle_path is None:
+            continue
+        for satellite in load.tle_file(tle_path):
+            norad_id = int(satellite.model.satnum)
+            epoch = satellite.epoch.utc_strftime("%Y-%m-%dT%H:%M:%SZ")
+            previous = state.get(str(norad_id), {})
+            end = (start + timedelta(hours=args.hours)).timestamp()
+            # TLE 没有更新、阈值相同、并且表已经覆盖到所需时间时跳过
+            if (
+                previous.get("epoch") == epoch
+                and previous.get("masks") == masks
+                and previous.get("covered_until", 0) >= end
+            ):
+                print(f"{norad_id}: TLE epoch {epoch} unchanged, table up to date")
+                continue
+            rows = compute_passes(satellite, place, ts, start, args.hours, masks, args.tz)
+            new_rows += rows
+            replace_from[norad_id] = start.timestamp()
+            state[str(norad_id)] = {"epoch": epoch, "masks": masks, "covered_until": end, "tle": os.path.relpath(tle_path, script_dir)}
+            print(f"{norad_id} ({satellite.name}): {len(rows)} passes for masks {masks} from TLE epoch {epoch}")
 
-    # from now to 2 days later considering timezone
-    t0 = ts.from_datetime(utc.datetime)
-    t1 = ts.from_datetime(utc.shift(days=+2).datetime)
-
-    satellite = load.tle_file(tle_path)[0]
-    t, events = satellite.find_events(place, t0, t1, altitude_degrees=degrees)
-    t: list[timelib.Time]
-    event_names = f"rise above {degrees}°", "culminate", f"set below {degrees}°"
-    events_path = os.path.join(events_dir, f"{unix_timestamp}.events")
-    with open(events_path, "wt") as f:
-        for ti, event in zip(t, events):
-            local_time = (
-                arrow.get(ti.utc_datetime())
-                .to("Asia/Shanghai")
-                .format("YYYY-MM-DD HH:mm:ss ZZ")
-            )
-            name = event_names[event]
-            f.write(f"{local_time} {name}\n")
-            if name.startswith("set"):
-                f.write("\n")
+    table = merge(table, new_rows, replace_from)
+    for fmt in args.formats:
+        WRITERS[fmt](os.path.join(events_dir, f"passes.{fmt}"), table)
+    if "csv" not in args.formats:
+        write_csv(table_path, table)  # CSV 是增量合并的基础，总是写
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=1)
+    print(f"Pass table: {len(table)} passes -> {events_dir}")
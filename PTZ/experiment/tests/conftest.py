@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试按 PTZ/experiment 下运行脚本的方式导入 utils/、daemon.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer
+from os.path import join
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+
+import daemon
+import ground_station as gs
+from utils.pass_plan import PassPlan
+from utils.ptz_sim import PTZSimulator
+
+TLE = join(gs.data_dir, "tle", "60745", "2024-11-26", "2024-11-26.tle")
+START = datetime(2024, 11, 28, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def station(monkeypatch, tmp_path):
+    with PTZSimulator(port=0) as sim:
+        monkeypatch.setattr(gs, "ip", sim.addr[0])
+        monkeypatch.setattr(gs, "port", sim.addr[1])
+        monkeypatch.setattr(gs, "local_ip", "127.0.0.1")
+        monkeypatch.setattr(gs, "local_port", 0)
+        monkeypatch.setattr(gs, "telemetry_port", None)
+        monkeypatch.setattr(gs, "pass_store_dir", str(tmp_path))
+        station = daemon.GroundStationDaemon(TLE)
+        yield station
+        station.poller.close()
+        station.sock.close()
+
+
+def test_replan_horizon(station):
+    station.replan(START)
+    assert station.planned_until == START + timedelta(hours=daemon.plan_hours)
+    assert not station.replan_due(START + timedelta(hours=1))
+    assert not station.replan_due(START + timedelta(hours=daemon.plan_hours / 2) - timedelta(minutes=1))
+    later = START + timedelta(hours=daemon.plan_hours / 2) + timedelta(minutes=1)
+    assert station.replan_due(later)
+    station.replan(later)
+    assert not station.replan_due(later + timedelta(hours=1))
+
+
+def test_replan_horizon_without_passes(station, monkeypatch):
+    monkeypatch.setattr(gs, "elevation_judge", 91.0)  # 没有任何过境
+    station.replan(START)
+    assert station.passes == []
+    assert not station.replan_due(START + timedelta(hours=1))
+    assert station.replan_due(START + timedelta(hours=daemon.plan_hours))
+
+
+def test_passes_rejects_bad_n(station):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), daemon._make_handler(station))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for bad in ("abc", "-1"):
+            with pytest.raises(HTTPError) as e:
+                urlopen(f"{base}/passes?n={bad}")
+            assert e.value.code == 400
+        with urlopen(f"{base}/passes?n=2") as r:
+            assert len(json.load(r)) <= 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stop_when_idle(station):
+    assert station.stop() is False
+
+
+@pytest.mark.parametrize("delay", [0.0, 0.3, 1.0])
+def test_stop_cancels_tracking(station, monkeypatch, delay):
+    # 在等待升起、登记调度器前后以及跟踪中途 stop()，跟踪线程都应很快结束
+    rise = datetime.now(timezone.utc) + timedelta(seconds=0.3)
+    n = 100
+    plan = PassPlan(rise, gs.tick_time, np.linspace(10, 40, n), np.linspace(100, 130, n))
+    monkeypatch.setattr(daemon, "sample_pass", lambda *args: plan)
+    station.track({"rise": rise, "set": rise + timedelta(seconds=20), "max_elevation": 40.0})
+    time.sleep(delay)
+    assert station.stop() is True
+    assert not station.tracking
+
+
+def test_forced_tle_download_saves_changed_elements(monkeypatch, tmp_path):
+    # 同一天里强制下载：内容没变返回原文件，变了另存一个排序更靠后的新文件
+    monkeypatch.setattr(gs, "data_dir", str(tmp_path))
+    with open(TLE) as f:
+        content = [f.read()]
+
+    class Response:
+        def __init__(self):
+            self.text = content[0]
+
+        def raise_for_status(self):
+            pass
+
+    monkeypatch.setattr(gs.requests, "get", lambda url: Response())
+    first = gs.download_tle(60745)
+    assert gs.download_tle(60745) == first
+    assert gs.download_tle(60745, force=True) == first
+    content[0] = content[0].replace("60745U", "60745U ", 1)
+    second = gs.download_tle(60745, force=True)
+    assert second != first
+    assert daemon.latest_tle(60745) == second
+
+
+def test_planner_survives_track_race(station, monkeypatch):
+    # /track 在规划线程检查之后抢先开始跟踪：track() 抛出的异常不能让规划线程退出
+    monkeypatch.setattr(daemon, "auto_track", True)
+    rise = datetime.now(timezone.utc) + timedelta(seconds=10)
+    monkeypatch.setattr(station, "next_passes", lambda n: [{"rise": rise}])
+    calls = []
+
+    def track(p):
+        calls.append(p)
+        raise RuntimeError("Already tracking a pass")
+
+    monkeypatch.setattr(station, "track", track)
+    stop_event = threading.Event()
+    planner = threading.Thread(target=station._planner, args=(stop_event,), daemon=True)
+    planner.start()
+    time.sleep(2.5)
+    assert planner.is_alive()
+    assert len(calls) >= 2
+    stop_event.set()
+    planner.join()
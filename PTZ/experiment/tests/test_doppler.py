@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from utils.doppler import SPEED_OF_LIGHT, DopplerCorrector, correct_file
+from utils.iq_file import IQReader, IQWriter
+
+CENTER = 435e6
+RATE = 50_000.0
+T0 = 1_700_000_000.0
+
+
+def _profile():
+    # 过境中段的距离变化率从 -7 km/s 线性变到 +7 km/s (±10 kHz 左右)
+    times = T0 + np.arange(0.0, 21.0, 1.0)
+    range_rates = np.linspace(-7000.0, 7000.0, times.size)
+    return times, range_rates
+
+
+def _corrector(remove):
+    times, range_rates = _profile()
+    return DopplerCorrector(CENTER, RATE, times, range_rates, T0, remove=remove)
+
+
+def _run(corrector, x, sizes):
+    out = []
+    for chunk in np.array_split(x.copy(), np.cumsum(sizes)):
+        out.append(corrector.process(chunk))
+    return np.concatenate(out)
+
+
+def test_round_trip_recovers_carrier():
+    n = int(20 * RATE)
+    carrier = np.ones(n, dtype=np.complex64)
+    shifted = _run(_corrector(remove=False), carrier, [1000, 4096, 77777, 300000])
+    assert np.abs(shifted - carrier).max() > 1.0  # 确实加上了多普勒
+    restored = _run(_corrector(remove=True), shifted, [65536] * 10)
+    assert np.abs(restored - carrier).max() < 1e-3
+
+
+def test_applied_frequency_matches_profile():
+    n = int(20 * RATE)
+    shifted = _run(_corrector(remove=False), np.ones(n, dtype=np.complex64), [n // 3])
+    # 相邻样点的相位差就是瞬时频偏
+    freq = np.angle(shifted[1:] * np.conj(shifted[:-1])) * RATE / (2 * np.pi)
+    t = T0 + np.arange(n - 1) / RATE
+    times, range_rates = _profile()
+    expected = -CENTER * np.interp(t, times, range_rates) / SPEED_OF_LIGHT
+    assert np.abs(expected).max() > 9000
+    np.testing.assert_allclose(freq, expected, atol=0.5)
+
+
+@pytest.mark.parametrize("index", [1, 12345, 500_000, 999_999])
+def test_seek_matches_continuous_processing(index):
+    n = int(20 * RATE)
+    x = np.ones(n, dtype=np.complex64)
+    continuous = _run(_corrector(remove=True), x, [n])
+    seeking = _corrector(remove=True)
+    tail = seeking.process(x[index:].copy(), start_index=index)
+    np.testing.assert_allclose(tail, continuous[index:], atol=1e-5)
+
+
+def test_correct_file_round_trip(tmp_path):
+    n = int(5 * RATE)
+    start = datetime.fromtimestamp(T0 + 3.0, timezone.utc)
+    src = str(tmp_path / "pass.cfile")
+    shifted = _corrector(remove=False)
+    shifted.t0 = start.timestamp()
+    with IQWriter(src, RATE, CENTER, start) as writer:
+        writer.write(shifted.process(np.ones(n, dtype=np.complex64)))
+    out = correct_file(src, str(tmp_path / "corrected.cfile"), _corrector(remove=True), chunk_size=12345)
+    restored = IQReader(out).chunks(n).__next__()[1]
+    assert restored.size == n
+    assert np.abs(restored - 1).max() < 1e-3
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from utils.iq_file import IQReader, IQWriter, read_meta
+
+START = datetime(2024, 11, 28, 3, 0, tzinfo=timezone.utc)
+
+
+def test_sidecar_tracks_data_while_capturing(tmp_path):
+    # 采集中途(没有 close)读到的 sidecar 样点数和文件里的数据一致
+    path = str(tmp_path / "pass.cfile")
+    writer = IQWriter(path, 1000.0, start_utc=START, meta_interval=0.0)
+    try:
+        writer.write(np.ones(300, dtype=np.complex64))
+        assert read_meta(path)["num_samples"] == 300 == len(IQReader(path))
+        writer.meta_interval = None
+        writer.write(np.ones(200, dtype=np.complex64))
+        assert read_meta(path)["num_samples"] == 300
+        writer.flush()
+        assert read_meta(path)["num_samples"] == 500 == len(IQReader(path))
+    finally:
+        writer.close()
+
+
+def test_at_time_rejects_out_of_range(tmp_path):
+    path = str(tmp_path / "pass.cfile")
+    with IQWriter(path, 1000.0, start_utc=START) as writer:
+        writer.write(np.arange(1000).astype(np.complex64))
+    reader = IQReader(path)
+    np.testing.assert_array_equal(reader.at_time(START + timedelta(seconds=0.5), 2).real, [500, 501])
+    np.testing.assert_array_equal(reader.at_time(0.25, 1).real, [250])
+    with pytest.raises(ValueError):
+        reader.at_time(START - timedelta(seconds=1), 10)
+    with pytest.raises(ValueError):
+        reader.at_time(1.0, 10)
@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+from utils.iq_ring import _WRITE_END, IQRingReader, IQRingWriter
+
+EXPERIMENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ramp(start, n):
+    # 样点值就是它的序号，便于检查顺序和位置
+    idx = np.arange(start, start + n)
+    return (idx + 1j * -idx).astype(np.complex64)
+
+
+def test_wrap_around_blocks_are_contiguous():
+    capacity, max_block = 1000, 300
+    with IQRingWriter(capacity, 1e6, max_block=max_block) as writer:
+        reader = IQRingReader(writer.name)
+        try:
+            written = 0
+            rng = np.random.default_rng(0)
+            got = []
+            # 写读交替，块大小不整除 capacity，多次跨过环尾
+            while written < 10 * capacity:
+                n = int(rng.integers(1, max_block + 1))
+                writer.write(_ramp(written, n))
+                written += n
+                while reader.available() >= 250:
+                    start, view = reader.read(250)
+                    np.testing.assert_array_equal(view, _ramp(start, 250))
+                    got.append(start)
+            writer.close()
+            for start, view in reader.blocks(250):
+                np.testing.assert_array_equal(view, _ramp(start, view.size))
+                got.append(start)
+            assert reader.pos == written
+            assert reader.dropped == 0
+            assert got == list(range(0, written, 250))
+        finally:
+            reader.close()
+
+
+def test_lapped_reader_skips_to_oldest():
+    with IQRingWriter(1000, 1e6, max_block=200) as writer:
+        reader = IQRingReader(writer.name)
+        try:
+            for k in range(10):
+                writer.write(_ramp(k * 200, 200))
+            start, view = reader.read(100)
+            assert start == 2000 - 1000
+            assert reader.dropped == 1000
+            np.testing.assert_array_equal(view, _ramp(start, 100))
+        finally:
+            reader.close()
+
+
+def test_time_of_follows_anchors():
+    with IQRingWriter(1000, 1000.0, max_block=100) as writer:
+        writer.write(_ramp(0, 100), t=50.0)
+        writer.write(_ramp(100, 100))
+        writer.write(_ramp(200, 100), t=60.0)  # 不连续：重新锚定
+        reader = IQRingReader(writer.name)
+        try:
+            assert reader.time_of(0) == pytest.approx(50.0)
+            assert reader.time_of(150) == pytest.approx(50.15)
+            assert reader.time_of(250) == pytest.approx(60.05)
+        finally:
+            reader.close()
+
+
+def test_block_larger_than_max_block_is_rejected():
+    with IQRingWriter(1000, 1e6, max_block=100) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros(101, dtype=np.complex64))
+
+
+def test_independent_reader_process_does_not_unlink(tmp_path):
+    # 独立启动的读进程退出后，共享内存仍在，写进程 unlink 时 resource_tracker 不报错
+    script = textwrap.dedent(
+        """
+        import subprocess, sys
+        import numpy as np
+        from utils.iq_ring import IQRingReader, IQRingWriter
+
+        with IQRingWriter(1000, 1e6, max_block=100) as writer:
+            writer.write(np.ones(100, dtype=np.complex64))
+            reader = (
+                "from utils.iq_ring import IQRingReader\\n"
+                f"r = IQRingReader({writer.name!r})\\n"
+                "assert r.read(100)[1].sum() == 100\\n"
+                "r.close()\\n"
+            )
+            subprocess.run([sys.executable, "-c", reader], check=True)
+            again = IQRingReader(writer.name)  # 同一进程里再挂一次
+            assert again.read(100) is not None
+            again.close()
+        print("done")
+        """
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        cwd=str(tmp_path),
+        timeout=60,
+        env={**os.environ, "PYTHONPATH": EXPERIMENT_DIR},
+    )
+    assert result.returncode == 0, result.stderr
+    assert "done" in result.stdout
+    assert "Traceback" not in result.stderr and "leaked" not in result.stderr, result.stderr
+
+
+def test_block_being_overwritten_is_detected():
+    with IQRingWriter(1000, 1e6, max_block=200) as writer:
+        reader = IQRingReader(writer.name)
+        try:
+            for k in range(5):
+                writer.write(_ramp(k * 200, 200))
+            blocks = reader.blocks(100)
+            start, view = next(blocks)
+            assert start == 0
+            # 读者还拿着 [0, 100) 时写进程开始覆盖它：回到 blocks() 时记为 overrun
+            writer.write(_ramp(1000, 50))
+            start, view = next(blocks)
+            assert reader.overruns == 1
+            # 模拟正在进行的写入(已登记 write_end、还没发布 write_pos)：被覆盖的样点不会交出去
+            writer.header[_WRITE_END] = 1050 + 200
+            start, view = reader.read(100, copy=True)
+            assert start == 250
+            np.testing.assert_array_equal(view, _ramp(250, 100))
+            assert reader.overruns == 1
+        finally:
+            reader.close()
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+from utils.logger import add_file_sink, disable_async_logging, enable_async_logging, packet_logger, remove_file_sink
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_packet_rate_limit_only_applies_to_console(tmp_path):
+    console = _ListHandler()
+    root = logging.getLogger()
+    root.addHandler(console)
+    level = root.level
+    root.setLevel(logging.INFO)
+    path = tmp_path / "pass.log"
+    try:
+        enable_async_logging(packet_rate=1.0, packet_burst=5)
+        sink = add_file_sink(str(path))
+        for i in range(51):
+            if i == 50:
+                time.sleep(1.1)  # 攒够一个令牌
+            packet_logger.info(f"packet {i}")
+        packet_logger.parent.info("not a packet")
+        disable_async_logging()  # 先写完队列
+        remove_file_sink(sink)
+    finally:
+        disable_async_logging()
+        root.removeHandler(console)
+        root.setLevel(level)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    # 文件里是全部记录，且没有限流器加的后缀
+    assert sum("packet " in line for line in lines) == 51
+    assert not any("suppressed" in line for line in lines)
+    assert any("not a packet" in line for line in lines)
+    # 终端只有 burst 条逐包日志和攒够令牌后的一条，其他 logger 不受影响
+    packets = [m for m in console.messages if m.startswith("packet ")]
+    assert len(packets) == 6
+    assert packets[-1] == "packet 50 (+45 suppressed)"
+    assert "not a packet" in console.messages
+
+
+class _RecordHandler(logging.Handler):
+    # 收到 "hold" 时停住监听线程，直到 resume 被置位
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.holding = threading.Event()
+        self.resume = threading.Event()
+
+    def emit(self, record):
+        self.records.append(record)
+        if record.getMessage() == "hold":
+            self.holding.set()
+            self.resume.wait(5.0)
+
+
+def test_async_logging_keeps_tracebacks_and_reports_drops():
+    console = _RecordHandler()
+    root = logging.getLogger()
+    root.addHandler(console)
+    level = root.level
+    root.setLevel(logging.INFO)
+    log = packet_logger.parent
+    try:
+        enable_async_logging(packet_rate=None, max_queue=1)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("tracking failed")
+        while not console.records:
+            time.sleep(0.01)
+        log.info("hold")
+        assert console.holding.wait(5.0)
+        for i in range(5):
+            log.info(f"flood {i}")  # 监听线程停住时队列只放得下一条
+        console.resume.set()
+        disable_async_logging()
+    finally:
+        console.resume.set()
+        disable_async_logging()
+        root.removeHandler(console)
+        root.setLevel(level)
+    failed = [r for r in console.records if r.getMessage() == "tracking failed"]
+    assert failed and failed[0].exc_info is not None and failed[0].exc_info[0] is ValueError
+    assert any("dropped 4 records" in r.getMessage() for r in console.records)
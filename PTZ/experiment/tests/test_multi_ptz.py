@@ -0,0 +1,28 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from utils.multi_ptz import MultiPTZController
+from utils.pass_plan import PassPlan
+from utils.ptz_sim import PTZSimulator
+
+
+def test_late_start_skips_missed_points():
+    # 升起 1 秒后才开始跟踪：错过的点直接丢弃，不连续补发
+    tick = 100
+    n = 20
+    t = np.arange(n) * tick / 1000.0
+    plan = PassPlan(datetime.now(timezone.utc) - timedelta(seconds=1.0), tick, 10 + t, 100 + t)
+    with PTZSimulator(port=0) as sim:
+        controller = MultiPTZController("127.0.0.1")
+        controller.add_gimbal("ptz1", *sim.addr, sim.add, plan)
+        (stats,) = asyncio.run(controller.run(wait_for_rise=True))
+        commands = [c[0] for c in sim.commands]
+    assert 8 <= stats["skipped"] <= 11
+    assert stats["late_ticks"] == 1
+    # 升起位置 1 次 + 剩下的点各 1 次，每次方位、俯仰两个包
+    assert stats["sent"] == 2 * (1 + n - stats["skipped"])
+    # 除去最开始的升起位置和第一个点，包之间按 tick 间隔发出
+    gaps = np.diff(commands[4::2])
+    assert gaps.min() > 0.05
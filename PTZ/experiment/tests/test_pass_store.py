@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from socket import AF_INET, SOCK_DGRAM, socket
+
+import numpy as np
+
+import ground_station as gs
+from utils.instrument import AckStats
+from utils.pass_plan import PassPlan
+from utils.pass_store import PassStore
+from utils.ptz_sim import PTZSimulator
+
+
+def test_pass_index_records_command_acks(monkeypatch, tmp_path):
+    # 每条定位命令的确认统计进入索引，可以按 acks_lost 查询
+    tick = 50
+    n = 20
+    t = np.arange(n) * tick / 1000.0
+    plan = PassPlan(datetime.now(timezone.utc), tick, 20 + t, 100 + t)
+    acks = AckStats()
+    with PTZSimulator(port=0) as sim:
+        monkeypatch.setattr(gs, "add", sim.add)
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        try:
+            gs.track_pass_position(sock, sim.addr, plan, acks=acks)
+        finally:
+            sock.close()
+    store = PassStore(str(tmp_path))
+    row = store.save_pass(plan, 60745, acks=acks)
+    assert row["commands_sent"] == row["commands_acked"] == 2 * n
+    assert row["acks_lost"] == 0
+    assert 0 < row["ack_rtt_p50_us"] <= row["ack_rtt_max_us"]
+    assert store.query(where=lambda r: r["acks_lost"] > 0) == []
+    assert store.query(where=lambda r: r["acks_lost"] == 0)[0]["id"] == row["id"]
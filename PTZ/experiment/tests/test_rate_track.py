@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timezone
+from socket import AF_INET, SOCK_DGRAM, socket
+
+import numpy as np
+import pytest
+
+from utils.pass_plan import PassPlan
+from utils.ptz_sim import PTZSimulator
+from utils.rate_track import MAX_RATE, quantize_rates, saturated, track_pass_rate
+from utils.tracking_log import TrackingRecorder
+
+
+def test_saturation_is_detected():
+    rates = np.array([0.0, MAX_RATE, MAX_RATE + 0.2, -10.0])
+    assert saturated(rates).tolist() == [False, False, True, True]
+    assert np.abs(quantize_rates(rates)).max() == round(MAX_RATE / 0.1)
+
+
+def test_steady_state_error_against_simulator():
+    # 匀速过境，云台初始偏离 (+2°, -1°)；每次校正后误差应收敛到量化误差量级，而不是来回振荡
+    tick = 0.05
+    t = np.arange(0, 8.5, tick)
+    plan = PassPlan(datetime.now(timezone.utc), int(tick * 1000), 20.0 + 0.37 * t, 100.0 + 1.23 * t)
+    with PTZSimulator(port=0, latency_jitter=0.0) as sim:
+        sim.az.pos = sim.az.target = 102.0
+        sim.el.pos = sim.el.target = 19.0
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        recorder = TrackingRecorder(plan, readback_period=2.0)
+        try:
+            track_pass_rate(sock, sim.addr, sim.add, plan, correction_period=2.0, correction_horizon=1.0, recorder=recorder)
+        finally:
+            sock.close()
+    cols = recorder.columns()
+    assert recorder.n >= 3
+    az_err = np.abs((cols["cmd_az"] - cols["az"] + 180) % 360 - 180)
+    el_err = np.abs(cols["cmd_el"] - cols["el"])
+    # 第一次回读看到的是初始偏差，之后都应已校正
+    assert abs(az_err[0] - 2.0) < 0.3 and abs(el_err[0] - 1.0) < 0.3
+    assert az_err[1:].max() < 0.3, az_err
+    assert el_err[1:].max() < 0.3, el_err
+
+
+def test_gimbal_is_stopped_on_error():
+    # 跟踪中途出错(这里是回读时 socket 出错)，云台收到的最后一条命令必须是停止
+    class FailingSocket:
+        def __init__(self, sock):
+            self.sock = sock
+
+        def __getattr__(self, name):
+            return getattr(self.sock, name)
+
+        def recvfrom(self, bufsize):
+            raise OSError("network is unreachable")
+
+    tick = 0.05
+    t = np.arange(0, 2.0, tick)
+    plan = PassPlan(datetime.now(timezone.utc), int(tick * 1000), 20.0 + 0.37 * t, 100.0 + 1.23 * t)
+    with PTZSimulator(port=0, latency_jitter=0.0) as sim:
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        try:
+            with pytest.raises(OSError):
+                track_pass_rate(FailingSocket(sock), sim.addr, sim.add, plan, correction_period=0.5)
+            time.sleep(0.1)
+        finally:
+            sock.close()
+        assert sim.commands[-1][1:] == (0x00, 0x00)
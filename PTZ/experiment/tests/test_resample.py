@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from utils.resample import Resampler, design_lowpass, resample
+from utils.sig import down_sample
+
+RATIOS = [(1, 4), (3, 2), (2, 3), (5, 7)]
+
+
+def _noise(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(n) + 1j * rng.standard_normal(n)).astype(np.complex64)
+
+
+def _reference(x, up, down, delay):
+    # 直接实现：插零上采样、整段卷积、每 down 个取一个
+    h = design_lowpass(up, down)
+    upsampled = np.zeros(x.size * up, dtype=np.complex128)
+    upsampled[::up] = x
+    filtered = np.convolve(upsampled, h)
+    return filtered[delay::down]
+
+
+@pytest.mark.parametrize("up,down", RATIOS)
+@pytest.mark.parametrize("compensate", [False, True])
+def test_chunked_matches_one_shot(up, down, compensate):
+    x = _noise(5000)
+    chunks = np.array_split(x, [7, 8, 500, 1999, 2000, 4100])
+    streaming = Resampler(up, down, compensate_delay=compensate)
+    chunked = np.concatenate([streaming.push(c) for c in chunks])
+    whole = Resampler(up, down, compensate_delay=compensate).push(x)
+    assert chunked.size == whole.size
+    np.testing.assert_array_equal(chunked, whole)
+
+
+@pytest.mark.parametrize("up,down", RATIOS)
+def test_matches_direct_convolution(up, down):
+    x = _noise(3000, seed=1)
+    r = Resampler(up, down)
+    out = r.push(x)
+    ref = _reference(x, up, down, 0)[: out.size]
+    np.testing.assert_allclose(out, ref, atol=1e-4)
+    compensated = resample(x, up, down)
+    ref = _reference(x, up, down, (32 * up - 1) // 2)[: compensated.size]
+    np.testing.assert_allclose(compensated[:-64], ref[:-64], atol=1e-4)
+
+
+@pytest.mark.parametrize("up,down", RATIOS + [(1, 1)])
+def test_one_shot_has_no_delay(up, down):
+    x = np.zeros(400, dtype=np.complex64)
+    x[120] = 1.0
+    y = resample(x, up, down)
+    assert y.size == -(-x.size * up // down)
+    assert np.argmax(np.abs(y)) == round(120 * up / down)
+
+
+def test_down_sample_lines_up_with_decimation():
+    t = np.arange(8000)
+    tone = np.exp(2j * np.pi * 0.01 * t).astype(np.complex64)
+    filtered = down_sample(tone, 4)
+    plain = down_sample(tone, 4, anti_alias=False)
+    assert filtered.size == plain.size
+    np.testing.assert_allclose(filtered[16:-16], plain[16:-16], atol=1e-3)
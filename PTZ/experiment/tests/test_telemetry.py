@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+from socket import AF_INET, SOCK_DGRAM, socket
+
+import numpy as np
+
+import ground_station as gs
+from utils.pass_plan import PassPlan
+from utils.ptz_sim import PTZSimulator
+from utils.scheduler import TickScheduler
+from utils.telemetry import TelemetryPoller, status_parsers
+from utils.tracking_log import TrackingRecorder
+
+
+def test_poller_shares_tracking_socket(monkeypatch):
+    # 遥测和跟踪共用一个 socket：回包按类型分流，双方都不能收走对方的回包，跟踪也不用等遥测
+    tick = 100
+    n = 25
+    t = np.arange(n) * tick / 1000.0
+    plan = PassPlan(datetime.now(timezone.utc), tick, 20 + t, 100 + t)
+    with PTZSimulator(port=0) as sim:
+        monkeypatch.setattr(gs, "add", sim.add)
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        poller = TelemetryPoller(sim.addr, sim.add, period=0.1, share=sock).start()
+        recorder = TrackingRecorder(plan, tick / 1000.0)
+        scheduler = TickScheduler(tick / 1000.0, n)
+        try:
+            gs.track_pass_position(poller.tracking_sock, sim.addr, plan, recorder, 1, scheduler=scheduler)
+        finally:
+            poller.close()
+        assert sock.fileno() != -1  # 共用的 socket 不由 poller 关闭
+        sock.close()
+    records = poller.records.snapshot()
+    assert len(records) >= 5
+    assert all(r.frames == len(status_parsers) and r.temperature is not None and r.work_mode is not None for r in records)
+    assert recorder.n == n  # 每个 tick 的角度回读都收到了
+    assert scheduler.overruns == 0
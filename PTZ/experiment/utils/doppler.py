@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import numpy as np
+
+from .iq_file import IQReader, map_chunks
+from .logger import logger
+from .pass_plan import PassPlan
+
+# 多普勒校正：由过境的距离变化率(range rate)得到每个样点的频偏
+# f_d(t) = -f_c * v_r(t) / c，用向量化的累加求相位，逐块混频把载波搬回固定频率。
+# 块与块之间延续相位，所以下游的前导检测和解调看到的是相位连续的平稳载波。
+
+SPEED_OF_LIGHT = 299_792_458.0
+
+
+def range_rate_profile(satellite, observer_location, ts, start: datetime, duration: float, step=1.0):
+    """
+    Range rate (m/s, positive = receding) of `satellite` seen from
+    `observer_location`, sampled every `step` seconds from `start`.
+    Returns (unix times, range rates); one vectorized skyfield call.
+    """
+    offsets = np.arange(0.0, duration + step, step)
+    times = ts.utc(start.year, start.month, start.day, start.hour, start.minute, start.second + start.microsecond / 1e6 + offsets)
+    range_rate = (satellite - observer_location).at(times).frame_latlon_and_rates(observer_location)[5]
+    return start.timestamp() + offsets, range_rate.km_per_s * 1000.0
+
+
+def plan_range_rates(plan: PassPlan, satellite, observer_location, ts, step=1.0):
+    # 覆盖整个 PassPlan 的距离变化率曲线
+    return range_rate_profile(satellite, observer_location, ts, plan.rise_time, plan.set_time - plan.t0, step)
+
+
+class DopplerCorrector:
+    """
+    Streaming, phase-continuous Doppler removal for IQ chunks.
+
+    times/range_rates is the pass profile (unix seconds, m/s), linearly
+    interpolated to every sample; t0 is the unix time of sample 0 of the
+    stream (e.g. IQReader.start_utc). Chunks must be passed in order;
+    process() mixes each one in place and carries the phase to the next.
+    remove=False applies the Doppler instead (to simulate a pass).
+    Blocks read from an IQRingReader are shared with other readers, so
+    copy them before correcting; pass their start index so dropped samples
+    are skipped with seek().
+    """
+
+    def __init__(self, center_freq, samp_rate, times, range_rates, t0: float, remove=True):
+        self.center_freq = float(center_freq)
+        self.samp_rate = float(samp_rate)
+        self.times = np.asarray(times, dtype=np.float64)
+        self.offsets = -self.center_freq * np.asarray(range_rates, dtype=np.float64) / SPEED_OF_LIGHT  # Hz
+        # 内部用相对曲线起点的时间：unix 秒(~1.7e9)的 float64 分辨率约 2e-7 s，
+        # 乘上 10 kHz 的频偏就是 1e-2 弧度量级的相位误差
+        self._rel_times = self.times - self.times[0]
+        # 频偏曲线在各节点处的积分(Hz*s)，seek() 用
+        self._integral = np.concatenate(([0.0], np.cumsum(np.diff(self._rel_times) * (self.offsets[1:] + self.offsets[:-1]) / 2)))
+        self.t0 = t0
+        self.sign = -1.0 if remove else 1.0
+        self.position = 0  # 下一个样点的序号
+        self.phase = 0.0  # 下一个样点的相位(弧度，模 2π)
+
+    @classmethod
+    def from_plan(cls, plan: PassPlan, satellite, observer_location, ts, center_freq, samp_rate, t0=None, step=1.0, **kwargs):
+        times, range_rates = plan_range_rates(plan, satellite, observer_location, ts, step)
+        return cls(center_freq, samp_rate, times, range_rates, plan.t0 if t0 is None else t0, **kwargs)
+
+    def offset_at(self, t) -> np.ndarray:
+        # 时刻 t(unix 秒)的多普勒频偏，Hz
+        return np.interp(t, self.times, self.offsets)
+
+    def integral(self, t: float) -> float:
+        # 频偏从曲线起点积分到 t(unix 秒)
+        return self._integral_rel(t - self.times[0])
+
+    def _integral_rel(self, t: float) -> float:
+        # 同上，t 为相对曲线起点的秒数(分段线性，两端外推为常数)
+        T, F, C = self._rel_times, self.offsets, self._integral
+        if t <= T[0]:
+            return F[0] * (t - T[0])
+        if t >= T[-1]:
+            return C[-1] + F[-1] * (t - T[-1])
+        k = int(np.searchsorted(T, t, side="right")) - 1
+        dt = t - T[k]
+        slope = (F[k + 1] - F[k]) / (T[k + 1] - T[k])
+        return C[k] + F[k] * dt + 0.5 * slope * dt * dt
+
+    def seek(self, index: int):
+        # 跳到流中的任意位置(例如环形缓冲区丢样之后)，相位取频偏的解析积分，
+        # 减去逐样点累加(左矩形和)与积分之间的半步差，和连续处理时的相位一致
+        base = self.t0 - self.times[0]
+        t = base + index / self.samp_rate
+        cycles = self._integral_rel(t) - self._integral_rel(base)
+        cycles -= (np.interp(t, self._rel_times, self.offsets) - np.interp(base, self._rel_times, self.offsets)) / (2 * self.samp_rate)
+        self.phase = float(np.mod(2 * np.pi * cycles, 2 * np.pi))
+        self.position = index
+
+    def process(self, chunk: np.ndarray, start_index: int | None = None) -> np.ndarray:
+        if start_index is not None and start_index != self.position:
+            self.seek(start_index)
+        n = chunk.size
+        t = (self.t0 - self.times[0]) + (self.position + np.arange(n)) / self.samp_rate
+        # 相位 = 前面所有样点频偏的累加(不含当前样点)
+        step = (2 * np.pi / self.samp_rate) * np.interp(t, self._rel_times, self.offsets)
+        phase = np.cumsum(step)
+        phase -= step
+        phase += self.phase
+        chunk *= np.exp(self.sign * 1j * phase).astype(chunk.dtype, copy=False)
+        self.phase = float(np.mod(phase[-1] + step[-1], 2 * np.pi)) if n else self.phase
+        self.position += n
+        return chunk
+
+    def __call__(self, chunk: np.ndarray) -> np.ndarray:
+        # 供 iq_file.map_chunks 使用；只读的 memmap 块先拷贝
+        if not chunk.flags.writeable:
+            chunk = chunk.copy()
+        return self.process(chunk)
+
+
+def correct_file(in_path: str, out_path: str, corrector: DopplerCorrector, chunk_size=1 << 20) -> str:
+    reader = IQReader(in_path)
+    if reader.start_utc is not None:
+        corrector.t0 = reader.start_utc.timestamp()
+    corrector.position, corrector.phase = 0, 0.0
+    span = corrector.offset_at(corrector.t0 + np.array([0.0, reader.duration]))
+    logger.info(f"Doppler correction {span[0]:+.0f} Hz -> {span[1]:+.0f} Hz over {reader.duration:.1f} s")
+    return map_chunks(in_path, out_path, corrector, chunk_size)
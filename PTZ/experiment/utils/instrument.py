@@ -0,0 +1,193 @@
+import time
+
+import numpy as np
+
+from .logger import logger
+
+# 跟踪循环的分阶段计时。每个 tick 各阶段耗时(纳秒)累加进预分配的二维数组，
+# 过境结束后给出 p50/p99/max 并保存逐 tick 时序；关闭时用 NULL_PROFILER，
+# 所有方法都是空操作，热路径上不做任何计时和内存分配。
+
+DEFAULT_STAGES = ("ephemeris", "encode", "sendto", "ack", "readback", "sleep_overshoot")
+
+perf_counter_ns = time.perf_counter_ns
+
+
+class TickProfiler:
+    def __init__(self, capacity: int, stages=DEFAULT_STAGES):
+        self.stages = tuple(stages)
+        self._index = {stage: i for i, stage in enumerate(self.stages)}
+        self.durations = np.zeros((capacity, len(self.stages)), dtype=np.int64)
+        self.tick_start = np.zeros(capacity, dtype=np.int64)
+        self.tick = -1
+
+    def begin_tick(self) -> int:
+        now = perf_counter_ns()
+        self.tick += 1
+        if self.tick == self.tick_start.size:
+            # 超出预分配长度时扩容一次
+            self.durations = np.concatenate((self.durations, np.zeros_like(self.durations)))
+            self.tick_start = np.concatenate((self.tick_start, np.zeros_like(self.tick_start)))
+        self.tick_start[self.tick] = now
+        return now
+
+    def now(self) -> int:
+        return perf_counter_ns()
+
+    def lap(self, stage: str, t0: int) -> int:
+        # 记录 t0 到现在的耗时，返回现在的时间，便于连续计时
+        now = perf_counter_ns()
+        self.durations[self.tick, self._index[stage]] += now - t0
+        return now
+
+    def add(self, stage: str, ns: int):
+        self.durations[self.tick, self._index[stage]] += ns
+
+    def summary(self) -> dict:
+        n = self.tick + 1
+        result = {"ticks": n}
+        if n == 0:
+            return result
+        us = self.durations[:n] / 1000.0
+        for i, stage in enumerate(self.stages):
+            col = us[:, i]
+            result[stage] = {
+                "p50_us": float(np.percentile(col, 50)),
+                "p99_us": float(np.percentile(col, 99)),
+                "max_us": float(col.max()),
+                "mean_us": float(col.mean()),
+            }
+        if n > 1:
+            period = np.diff(self.tick_start[:n]) / 1000.0
+            result["tick_period"] = {
+                "p50_us": float(np.percentile(period, 50)),
+                "p99_us": float(np.percentile(period, 99)),
+                "max_us": float(period.max()),
+                "mean_us": float(period.mean()),
+            }
+        return result
+
+    def save(self, path: str) -> str:
+        n = self.tick + 1
+        np.savez_compressed(
+            path,
+            stages=np.array(self.stages),
+            durations_ns=self.durations[:n],
+            tick_start_ns=self.tick_start[:n] - (self.tick_start[0] if n else 0),
+        )
+        logger.info(f"Saved {n}-tick timing trace to {path!r}")
+        return path
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(f"Tick timing over {summary['ticks']} ticks (p50 / p99 / max, us):")
+        for stage in self.stages + ("tick_period",):
+            if stage in summary:
+                s = summary[stage]
+                logger.info(f"  {stage:>16}: {s['p50_us']:10.1f} / {s['p99_us']:10.1f} / {s['max_us']:10.1f}")
+
+
+class NullProfiler:
+    stages = ()
+
+    def begin_tick(self) -> int:
+        return 0
+
+    def now(self) -> int:
+        return 0
+
+    def lap(self, stage: str, t0: int) -> int:
+        return 0
+
+    def add(self, stage: str, ns: int):
+        pass
+
+    def summary(self) -> dict:
+        return {}
+
+    def log_summary(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram for open-ended latency streams (e.g. per-ack RTT in a
+    long-running process): log2 octaves split into 2**sub_bits linear
+    sub-buckets, so every recorded value keeps about 2**-sub_bits relative
+    precision in constant memory.
+    """
+
+    def __init__(self, sub_bits=4, max_octaves=48):
+        self.sub_bits = sub_bits
+        self.counts = np.zeros((max_octaves, 1 << sub_bits), dtype=np.int64)
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_ns: int):
+        value_ns = max(int(value_ns), 1)
+        octave = value_ns.bit_length() - 1
+        shift = max(octave - self.sub_bits, 0)
+        sub = (value_ns >> shift) & ((1 << self.sub_bits) - 1)
+        self.counts[min(octave, self.counts.shape[0] - 1), sub] += 1
+        self.total += 1
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def _bucket_values(self) -> np.ndarray:
+        octaves = np.arange(self.counts.shape[0])[:, None]
+        subs = np.arange(1 << self.sub_bits)[None, :]
+        shift = np.maximum(octaves - self.sub_bits, 0)
+        # octave >= sub_bits: value = (2**sub_bits + sub) << shift; below that the value is the sub index itself
+        high = ((1 << self.sub_bits) + subs) << shift
+        return np.where(octaves >= self.sub_bits, high, subs).astype(np.float64)
+
+    def percentile(self, q: float) -> float:
+        if self.total == 0:
+            return 0.0
+        flat_counts = self.counts.ravel()
+        flat_values = self._bucket_values().ravel()
+        order = np.argsort(flat_values, kind="stable")
+        cumulative = np.cumsum(flat_counts[order])
+        rank = int(np.ceil(q / 100.0 * self.total))
+        return float(flat_values[order][np.searchsorted(cumulative, max(rank, 1))])
+
+    def summary(self) -> dict:
+        return {
+            "count": self.total,
+            "p50_us": self.percentile(50) / 1000.0,
+            "p99_us": self.percentile(99) / 1000.0,
+            "max_us": self.max / 1000.0,
+        }
+
+
+class AckStats:
+    """
+    Angle commands sent vs acknowledged over one pass, with the ack
+    round-trip time of every acknowledged command.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.acked = 0
+        self.rtt = LatencyHistogram()
+
+    def record(self, rtt_ns=None):
+        # 一条定位命令；rtt_ns 为 None 表示没有收到确认
+        self.sent += 1
+        if rtt_ns is not None:
+            self.acked += 1
+            self.rtt.record(rtt_ns)
+
+    def summary(self) -> dict:
+        rtt = self.rtt.summary()
+        return {
+            "commands_sent": self.sent,
+            "commands_acked": self.acked,
+            "acks_lost": self.sent - self.acked,
+            "ack_rtt_p50_us": rtt["p50_us"],
+            "ack_rtt_p99_us": rtt["p99_us"],
+            "ack_rtt_max_us": rtt["max_us"],
+        }
@@ -0,0 +1,254 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator
+
+import numpy as np
+
+from .logger import logger
+
+# .cfile recordings are raw interleaved complex64 (GNU Radio file sink format);
+# everything we know about the capture lives in a JSON sidecar next to it.
+IQ_DTYPE = np.dtype(np.complex64)
+
+
+def meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _parse_utc(value) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def read_meta(path: str) -> dict:
+    sidecar = meta_path(path)
+    if not os.path.exists(sidecar):
+        return {}
+    with open(sidecar, "r") as f:
+        return json.load(f)
+
+
+def write_meta(
+    path: str,
+    samp_rate: float,
+    center_freq: float = 0.0,
+    start_utc: datetime | None = None,
+    pass_id: str | None = None,
+    num_samples: int | None = None,
+    **extra,
+) -> str:
+    if start_utc is not None and start_utc.tzinfo is None:
+        start_utc = start_utc.replace(tzinfo=timezone.utc)
+    meta = {
+        "dtype": IQ_DTYPE.name,
+        "samp_rate": float(samp_rate),
+        "center_freq": float(center_freq),
+        "start_utc": start_utc.isoformat() if start_utc is not None else None,
+        "pass_id": pass_id,
+        "num_samples": num_samples,
+        **extra,
+    }
+    sidecar = meta_path(path)
+    # 先写临时文件再替换，采集中途崩溃也不会留下写了一半的 sidecar
+    tmp = sidecar + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, sidecar)
+    return sidecar
+
+
+class IQWriter:
+    """
+    Append-mode writer for .cfile recordings.
+
+    Blocks are written straight to disk as complex64, so a capture never has
+    to fit in memory. flush() pushes the data to disk and rewrites the
+    sidecar with the current sample count; write() does so at most every
+    `meta_interval` seconds (None = only on flush/close), so after a crash
+    the sidecar lags the data by at most that much.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        samp_rate: float | None = None,
+        center_freq: float = 0.0,
+        start_utc: datetime | None = None,
+        pass_id: str | None = None,
+        append: bool = False,
+        meta_interval: float | None = 1.0,
+    ):
+        self.path = path
+        self.meta_interval = meta_interval
+        meta = read_meta(path) if append else {}
+        if samp_rate is None:
+            samp_rate = meta.get("samp_rate")
+        if samp_rate is None:
+            raise ValueError(f"samp_rate is required for new recording {path!r}")
+        self.samp_rate = float(samp_rate)
+        self.center_freq = float(meta.get("center_freq", center_freq))
+        self.start_utc = _parse_utc(meta.get("start_utc")) or start_utc
+        self.pass_id = meta.get("pass_id", pass_id)
+        self._extra = {
+            k: v
+            for k, v in meta.items()
+            if k not in ("dtype", "samp_rate", "center_freq", "start_utc", "pass_id", "num_samples")
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "ab" if append else "wb")
+        self.num_samples = self._file.tell() // IQ_DTYPE.itemsize
+        self._flush_meta()
+        self._meta_time = time.monotonic()
+
+    def _flush_meta(self):
+        write_meta(
+            self.path,
+            self.samp_rate,
+            self.center_freq,
+            self.start_utc,
+            self.pass_id,
+            self.num_samples,
+            **self._extra,
+        )
+
+    def write(self, block: np.ndarray) -> int:
+        block = np.asarray(block, dtype=IQ_DTYPE)
+        block.tofile(self._file)
+        self.num_samples += block.size
+        if self.meta_interval is not None and time.monotonic() - self._meta_time >= self.meta_interval:
+            self.flush()
+        return self.num_samples
+
+    def flush(self):
+        # sidecar 里的样点数只计已经写到文件里的数据
+        self._file.flush()
+        self._flush_meta()
+        self._meta_time = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        self._flush_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class IQReader:
+    """
+    Memory-mapped view of a .cfile recording plus its sidecar metadata.
+
+    Nothing is read from disk until a slice of `data` is touched, so
+    recordings far larger than RAM can be walked chunk by chunk.
+    """
+
+    def __init__(self, path: str, samp_rate: float | None = None, mode: str = "r"):
+        self.path = path
+        meta = read_meta(path)
+        self.meta = meta
+        self.samp_rate = float(samp_rate if samp_rate is not None else meta.get("samp_rate", 0.0))
+        if self.samp_rate <= 0:
+            raise ValueError(f"No sample rate for {path!r}, pass samp_rate or add a sidecar")
+        self.center_freq = float(meta.get("center_freq", 0.0))
+        self.start_utc = _parse_utc(meta.get("start_utc"))
+        self.pass_id = meta.get("pass_id")
+        if os.path.getsize(path) < IQ_DTYPE.itemsize:
+            self.data = np.zeros(0, dtype=IQ_DTYPE)
+        else:
+            self.data = np.memmap(path, dtype=IQ_DTYPE, mode=mode)
+
+    def __len__(self) -> int:
+        return self.data.size
+
+    @property
+    def duration(self) -> float:
+        return self.data.size / self.samp_rate
+
+    def index_of(self, when: datetime | float) -> int:
+        # datetime -> absolute UTC time; float -> seconds from the start of the recording
+        if isinstance(when, datetime):
+            if self.start_utc is None:
+                raise ValueError(f"{self.path!r} has no start_utc, cannot seek by timestamp")
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            when = (when - self.start_utc).total_seconds()
+        return int(round(when * self.samp_rate))
+
+    def time_of(self, index: int) -> datetime | float:
+        offset = index / self.samp_rate
+        if self.start_utc is None:
+            return offset
+        return self.start_utc + timedelta(seconds=offset)
+
+    def at_time(self, when: datetime | float, num_samples: int) -> np.ndarray:
+        start = self.index_of(when)
+        if not 0 <= start < self.data.size:
+            raise ValueError(f"{when} is outside {self.path!r} (samples 0..{self.data.size - 1}, got {start})")
+        return self.data[start : start + num_samples]
+
+    def chunks(
+        self, chunk_size: int, overlap: int = 0, start: int = 0, stop: int | None = None
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        Yield (start_index, chunk) pairs. Each chunk after the first repeats the
+        last `overlap` samples of the previous one, which is what overlap-save
+        filters and sliding FFTs need at chunk boundaries.
+        """
+        if overlap >= chunk_size:
+            raise ValueError(f"overlap ({overlap}) must be smaller than chunk_size ({chunk_size})")
+        stop = self.data.size if stop is None else min(stop, self.data.size)
+        step = chunk_size - overlap
+        idx = start
+        while idx < stop:
+            yield idx, self.data[idx : min(idx + chunk_size, stop)]
+            if idx + chunk_size >= stop:
+                break
+            idx += step
+
+    def sliced(self, slicing_len: int) -> np.ndarray:
+        # zero-copy 2D view of whole slices; the trailing partial slice is dropped
+        slices_num = self.data.size // slicing_len
+        return self.data[: slices_num * slicing_len].reshape(slices_num, slicing_len)
+
+
+def save_cfile(
+    path: str,
+    sig: np.ndarray,
+    samp_rate: float,
+    center_freq: float = 0.0,
+    start_utc: datetime | None = None,
+    pass_id: str | None = None,
+) -> str:
+    with IQWriter(path, samp_rate, center_freq, start_utc, pass_id) as writer:
+        writer.write(sig)
+    logger.info(f"Saved {writer.num_samples} samples to {path!r}")
+    return path
+
+
+def map_chunks(
+    in_path: str,
+    out_path: str,
+    func: Callable[[np.ndarray], np.ndarray],
+    chunk_size: int = 1 << 20,
+) -> str:
+    """
+    Stream `func` over a recording and write the result to a new .cfile.
+    `func` must be sample-wise (e.g. lambda c: c * 0.5, np.conj) or carry
+    its own state between calls (e.g. a doppler.DopplerCorrector); anything
+    that normalises per call, such as add_noise, would depend on chunk_size.
+    """
+    reader = IQReader(in_path)
+    with IQWriter(
+        out_path, reader.samp_rate, reader.center_freq, reader.start_utc, reader.pass_id
+    ) as writer:
+        for _, chunk in reader.chunks(chunk_size):
+            writer.write(func(np.asarray(chunk)))
+    logger.info(f"Processed {len(reader)} samples {in_path!r} -> {out_path!r}")
+    return out_path
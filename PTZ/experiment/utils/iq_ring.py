@@ -0,0 +1,333 @@
+import os
+import sys
+import time
+from multiprocessing import parent_process, resource_tracker, shared_memory
+
+import numpy as np
+
+from .iq_file import IQ_DTYPE, IQReader
+from .logger import logger
+
+# 共享内存 IQ 环形缓冲区：一个写进程(SDR 采集或文件回放)，任意多个读进程
+# (前导检测、解调……)各自在自己的核上按自己的进度读同一条实时数据流。
+# 读到的块是共享内存上的视图，不拷贝；环的末尾多出 max_block 个样点镜像环首，
+# 所以任意位置开始、不超过 max_block 的块都是连续的。
+# 时间戳用锚点(样点序号, unix 秒)表示，和 PassPlan.times 在同一时间轴上。
+# 写进程先登记本次要写到的位置(write_end)再拷贝，拷完才发布 write_pos；读进程交出块之前
+# 和用完之后各查一次 write_end(类似 seqlock)，就能发现块是否正被覆盖或已被覆盖。
+#
+# 共享内存布局: int64 头 | float64 头 | 锚点序号 int64[A] | 锚点时间 float64[A] | complex64[capacity + max_block]
+
+MAGIC = 0x49515249_4E47  # "IQRING"
+_HEADER_INTS = 9
+_HEADER_FLOATS = 2
+# int64 头各字段
+_MAGIC, _CAPACITY, _MIRROR, _WRITE_POS, _CLOSED, _ANCHORS, _ANCHOR_COUNT, _WRITER_PID, _WRITE_END = range(9)
+
+
+def _layout(capacity: int, mirror: int, anchors: int) -> tuple[int, int, int, int, int]:
+    ints = 0
+    floats = ints + _HEADER_INTS * 8
+    anchor_idx = floats + _HEADER_FLOATS * 8
+    anchor_t = anchor_idx + anchors * 8
+    data = anchor_t + anchors * 8
+    data = (data + 63) // 64 * 64
+    return floats, anchor_idx, anchor_t, data, data + (capacity + mirror) * IQ_DTYPE.itemsize
+
+
+class _RingView:
+    def __init__(self, shm: shared_memory.SharedMemory, capacity=None, mirror=None, anchors=None):
+        self.shm = shm
+        header = np.ndarray((_HEADER_INTS,), dtype=np.int64, buffer=shm.buf)
+        if capacity is None:
+            if header[_MAGIC] != MAGIC:
+                raise ValueError(f"Shared memory {shm.name!r} is not an IQ ring buffer")
+            capacity, mirror, anchors = (int(header[i]) for i in (_CAPACITY, _MIRROR, _ANCHORS))
+        floats, anchor_idx, anchor_t, data, _ = _layout(capacity, mirror, anchors)
+        self.header = header
+        self.floats = np.ndarray((_HEADER_FLOATS,), dtype=np.float64, buffer=shm.buf, offset=floats)
+        self.anchor_idx = np.ndarray((anchors,), dtype=np.int64, buffer=shm.buf, offset=anchor_idx)
+        self.anchor_t = np.ndarray((anchors,), dtype=np.float64, buffer=shm.buf, offset=anchor_t)
+        self.data = np.ndarray((capacity + mirror,), dtype=IQ_DTYPE, buffer=shm.buf, offset=data)
+        self.capacity = capacity
+        self.mirror = mirror
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def samp_rate(self) -> float:
+        return float(self.floats[0])
+
+    @property
+    def write_pos(self) -> int:
+        return int(self.header[_WRITE_POS])
+
+    @property
+    def write_end(self) -> int:
+        # 正在进行的写入结束的位置；空闲时等于 write_pos
+        return int(self.header[_WRITE_END])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.header[_CLOSED])
+
+    def time_of(self, index) -> float:
+        # unix 秒；取不晚于 index 的最近锚点外推
+        count = int(self.header[_ANCHOR_COUNT])
+        if count == 0:
+            return float("nan")
+        n = self.anchor_idx.size
+        order = np.arange(max(count - n, 0), count) % n
+        idx, t = self.anchor_idx[order], self.anchor_t[order]
+        k = max(int(np.searchsorted(idx, index, side="right")) - 1, 0)
+        return float(t[k] + (index - idx[k]) / self.samp_rate)
+
+
+class IQRingWriter(_RingView):
+    """
+    Single producer side of a shared-memory complex64 ring.
+
+    write() announces the end of the block (write_end), copies it in (at
+    most max_block samples) and then publishes the new write position; it never waits for readers, so slow
+    readers lose data instead of stalling capture. `t` anchors the first
+    sample of the block to a unix timestamp (given automatically for the
+    first block; pass it again after any discontinuity).
+    """
+
+    def __init__(self, capacity: int, samp_rate: float, max_block=65536, name=None, anchors=1024):
+        if max_block > capacity:
+            raise ValueError(f"max_block ({max_block}) must not exceed capacity ({capacity})")
+        size = _layout(capacity, max_block, anchors)[-1]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        super().__init__(shm, capacity, max_block, anchors)
+        self.header[:] = 0
+        self.header[_MAGIC] = MAGIC
+        self.header[_CAPACITY] = capacity
+        self.header[_MIRROR] = max_block
+        self.header[_ANCHORS] = anchors
+        self.header[_WRITER_PID] = os.getpid()
+        self.floats[0] = samp_rate
+
+    def anchor(self, index: int, t: float):
+        count = int(self.header[_ANCHOR_COUNT])
+        slot = count % self.anchor_idx.size
+        self.anchor_t[slot] = t
+        self.anchor_idx[slot] = index
+        self.header[_ANCHOR_COUNT] = count + 1
+
+    def write(self, block: np.ndarray, t: float | None = None) -> int:
+        n = block.size
+        if n > self.mirror:
+            raise ValueError(f"Block of {n} samples exceeds max_block ({self.mirror})")
+        start = self.write_pos
+        if t is not None or self.header[_ANCHOR_COUNT] == 0:
+            self.anchor(start, time.time() if t is None else t)
+        self.header[_WRITE_END] = start + n
+        pos = start % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos : pos + first] = block[:first]
+        self.data[: n - first] = block[first:]
+        # 镜像区: 环首 [0, mirror) 的内容同时写到 [capacity, capacity + mirror)
+        lo, hi = pos, pos + first
+        if lo < self.mirror:
+            self.data[self.capacity + lo : self.capacity + min(hi, self.mirror)] = block[: min(hi, self.mirror) - lo]
+        if n > first:
+            wrapped = min(n - first, self.mirror)
+            self.data[self.capacity : self.capacity + wrapped] = block[first : first + wrapped]
+        self.header[_WRITE_POS] = start + n
+        return start
+
+    def close(self):
+        # 标记流结束，读者读完剩余数据后退出
+        self.header[_CLOSED] = 1
+
+    def unlink(self):
+        self.close()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+
+
+def _shares_tracker(writer_pid: int) -> bool:
+    # 同一进程，或由写进程用 multiprocessing 启动的子进程(fork/spawn/forkserver 都继承父进程的 tracker)
+    parent = parent_process()
+    return os.getpid() == writer_pid or (parent is not None and parent.pid == writer_pid)
+
+
+class IQRingReader(_RingView):
+    """
+    One consumer of an IQRingWriter, attached by shared-memory name.
+
+    Each reader keeps its own position. blocks() yields (start_index, view)
+    pairs that point straight into shared memory (or private copies with
+    copy=True); if the writer laps the reader, the missing samples are
+    skipped and counted in `dropped`. Samples the writer is overwriting are
+    never handed out, and a block is checked again once the caller is done
+    with it (for copies: once copied). `overruns` counts the blocks found
+    overwritten by that check, so a zero-copy view that was torn while in
+    use is only detected when control returns to blocks(), or when the
+    caller itself checks intact(start).
+    """
+
+    def __init__(self, name: str, start="oldest", poll_interval=0.001):
+        # 只读端不负责回收共享内存。Python 3.13+ 直接不登记(track=False)；更早的版本里
+        # 独立启动的读进程有自己的 resource_tracker，退出时会把共享内存 unlink 掉，所以要注销。
+        # 写进程本身和它的 multiprocessing 子进程与写进程共用 tracker，注销会删掉写进程的登记
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+            super().__init__(shm)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            super().__init__(shm)
+            if not _shares_tracker(int(self.header[_WRITER_PID])):
+                resource_tracker.unregister(shm._name, "shared_memory")
+        self.poll_interval = poll_interval
+        write_pos = self.write_pos
+        if start == "oldest":
+            self.pos = max(write_pos - self.capacity, 0)
+        elif start == "latest":
+            self.pos = write_pos
+        else:
+            self.pos = int(start)
+        self.dropped = 0
+        self.overruns = 0
+
+    def available(self) -> int:
+        return self.write_pos - self.pos
+
+    def intact(self, start: int) -> bool:
+        # 从 start 开始的块还没有被写进程(包括正在进行的写入)覆盖
+        return self.write_end <= start + self.capacity
+
+    def _catch_up(self, write_end: int):
+        oldest = write_end - self.capacity
+        if self.pos < oldest:
+            self.dropped += oldest - self.pos
+            self.pos = oldest
+
+    def read(self, n: int, timeout: float | None = None, copy=False) -> tuple[int, np.ndarray] | None:
+        # 等到有 n 个新样点(或流已结束时剩余的样点)，返回 (起始序号, 视图或拷贝)；超时或读完返回 None
+        if n > self.mirror:
+            raise ValueError(f"Block of {n} samples exceeds the ring's max_block ({self.mirror})")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            write_pos = self.write_pos
+            # 按 write_end 跳过正在被覆盖的样点，交出去的块在交出时是完整的
+            self._catch_up(self.write_end)
+            ready = write_pos - self.pos
+            if ready >= n or (self.closed and ready > 0):
+                break
+            if self.closed or (deadline is not None and time.monotonic() > deadline):
+                return None
+            time.sleep(self.poll_interval)
+        count = min(n, ready)
+        start = self.pos
+        pos = start % self.capacity
+        self.pos += count
+        block = self.data[pos : pos + count]
+        if copy:
+            block = block.copy()
+            if not self.intact(start):
+                self.overruns += 1
+        return start, block
+
+    def blocks(self, block_size: int, overlap: int = 0, timeout: float | None = None, copy=False):
+        if overlap >= block_size:
+            raise ValueError(f"overlap ({overlap}) must be smaller than block_size ({block_size})")
+        while True:
+            got = self.read(block_size, timeout, copy)
+            if got is None:
+                return
+            start, view = got
+            yield start, view
+            # 拷贝在 read() 里已经检查过
+            if not copy and not self.intact(start):
+                self.overruns += 1
+            if view.size == block_size and overlap:
+                self.pos -= overlap
+
+    def close(self):
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay_file(source: IQReader | str, writer: IQRingWriter, block_size=16384, realtime=True, t0=None) -> int:
+    """
+    Feed a recording into the ring as if it came from the SDR.
+
+    Blocks are released at the file's sample rate when `realtime` is set.
+    Sample 0 is anchored at `t0` (unix seconds, e.g. PassPlan.t0), else at
+    the recording's start_utc, else at the current time.
+    """
+    reader = source if isinstance(source, IQReader) else IQReader(source)
+    if t0 is None:
+        t0 = reader.start_utc.timestamp() if reader.start_utc is not None else time.time()
+    block_size = min(block_size, writer.mirror)
+    started = time.monotonic()
+    written = 0
+    for idx, chunk in reader.chunks(block_size):
+        if realtime:
+            delay = started + idx / reader.samp_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        writer.write(chunk, t0 + idx / reader.samp_rate if idx == 0 else None)
+        written += chunk.size
+    writer.close()
+    logger.info(f"Replayed {written} samples from {reader.path!r} into ring {writer.name!r}")
+    return written
+
+
+def _consume(name: str, block_size: int, result_queue):
+    # 示例读进程：逐块计算平均功率
+    with IQRingReader(name) as reader:
+        started = time.perf_counter()
+        samples = 0
+        power = 0.0
+        for _, view in reader.blocks(block_size):
+            power += float(np.vdot(view, view).real)
+            samples += view.size
+        elapsed = time.perf_counter() - started
+        result_queue.put((samples, power / max(samples, 1), reader.dropped, reader.overruns, elapsed))
+
+
+if __name__ == "__main__":
+    # 回放一个 .cfile 到环形缓冲区，多个读进程同时消费
+    import argparse
+    import multiprocessing as mp
+
+    parser = argparse.ArgumentParser(description="Replay an IQ recording through the shared-memory ring")
+    parser.add_argument("path")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--block", type=int, default=16384)
+    parser.add_argument("--capacity", type=int, default=1 << 22)
+    parser.add_argument("--fast", action="store_true", help="不按采样率节拍回放，尽可能快")
+    args = parser.parse_args()
+
+    source = IQReader(args.path)
+    results = mp.Queue()
+    with IQRingWriter(args.capacity, source.samp_rate, max_block=args.block) as writer:
+        procs = [mp.Process(target=_consume, args=(writer.name, args.block, results)) for _ in range(args.readers)]
+        for p in procs:
+            p.start()
+        time.sleep(0.5)  # 等读进程挂上
+        replay_file(source, writer, args.block, realtime=not args.fast)
+        for p in procs:
+            p.join()
+    for i in range(args.readers):
+        samples, power, dropped, overruns, elapsed = results.get()
+        logger.info(
+            f"reader: {samples} samples, mean power {power:.3f}, dropped {dropped}, overruns {overruns}, "
+            f"{samples / elapsed / 1e6:.1f} MS/s"
+        )
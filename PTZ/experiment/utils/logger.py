@@ -1,5 +1,11 @@
+import atexit
 import click
+import copy
 import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 from rich.logging import RichHandler
 
 logging.basicConfig(
@@ -10,3 +16,158 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger("rich")
+# 逐包收发的报文日志，单独的子 logger，便于限流或整体关闭
+packet_logger = logger.getChild("packet")
+
+FILE_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)-7s [%(threadName)s %(module)s.%(funcName)s] %(message)s"
+
+# 异步日志：调用线程只把格式化好的记录放进队列，Rich 终端渲染和文件写入都在监听线程里完成，
+# 不会占用跟踪循环的 tick 时间。逐包日志的限流只挂在终端 handler 上，过境文件日志保留全部记录
+_listener = None
+_listener_lock = threading.Lock()
+_console_filter = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site (logger name + line number): at most `rate`
+    records per second after an initial `burst`. The next record that gets
+    through carries the number of records dropped in between. With
+    `logger_name` set, only records from that logger and its children are
+    limited; everything else passes.
+    """
+
+    def __init__(self, rate=5.0, burst=10, logger_name=None):
+        super().__init__()
+        self.logger_name = logger_name
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # (name, lineno) -> [tokens, last time, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.logger_name is not None and not (
+            record.name == self.logger_name or record.name.startswith(self.logger_name + ".")
+        ):
+            return True
+        # 同一个过滤器挂在多个终端 handler 上时，每条记录只判断一次
+        decided = getattr(record, "_rate_limit_pass", None)
+        if decided is not None:
+            return decided
+        record._rate_limit_pass = self._admit(record)
+        return record._rate_limit_pass
+
+    def _admit(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1.0
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()} (+{suppressed} suppressed)"
+            record.args = None
+        return True
+
+
+def enable_async_logging(packet_rate=5.0, packet_burst=10, max_queue=10000) -> QueueListener:
+    # 把根 logger 的现有 handler 挪到监听线程后面，根 logger 只保留一个 QueueHandler；
+    # packet_rate 为终端上逐包日志每秒最多条数，None 为不限流
+    global _listener, _console_filter
+    with _listener_lock:
+        if _listener is not None:
+            return _listener
+        root = logging.getLogger()
+        handlers = tuple(root.handlers)
+        for handler in handlers:
+            root.removeHandler(handler)
+        log_queue = queue.Queue(max_queue)
+        root.addHandler(_DroppingQueueHandler(log_queue))
+        if packet_rate is not None:
+            _console_filter = RateLimitFilter(packet_rate, packet_burst, packet_logger.name)
+            for handler in handlers:
+                handler.addFilter(_console_filter)
+        _listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    atexit.register(disable_async_logging)
+    return _listener
+
+
+def disable_async_logging():
+    # 停止监听线程(会先写完队列里剩余的记录)，恢复同步 handler
+    global _listener, _console_filter
+    with _listener_lock:
+        if _listener is None:
+            return
+        root = logging.getLogger()
+        dropped = 0
+        for handler in list(root.handlers):
+            if isinstance(handler, QueueHandler):
+                root.removeHandler(handler)
+                dropped += getattr(handler, "dropped", 0)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.removeFilter(_console_filter)
+            root.addHandler(handler)
+        _listener = None
+        _console_filter = None
+    if dropped:
+        logger.warning(f"Async logging dropped {dropped} records because the queue was full")
+
+
+def add_file_sink(path: str, level=logging.DEBUG) -> logging.Handler:
+    # 为一次过境加一个文件日志；异步模式下挂在监听线程上，否则直接挂在根 logger 上。
+    # 放在终端 handler 之前：限流器给放行的记录加 "(+N suppressed)" 时改的是同一条记录
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter(FILE_FORMAT, datefmt="%Y-%m-%dT%H:%M:%S"))
+    with _listener_lock:
+        if _listener is not None:
+            _listener.handlers = (handler,) + _listener.handlers
+        else:
+            logging.getLogger().addHandler(handler)
+    return handler
+
+
+def remove_file_sink(handler: logging.Handler):
+    with _listener_lock:
+        if _listener is not None:
+            _listener.handlers = tuple(h for h in _listener.handlers if h is not handler)
+        else:
+            logging.getLogger().removeHandler(handler)
+    handler.close()
+
+
+class _Listener(QueueListener):
+    # 队列满时等监听线程腾出位置再放停止标记，默认的 put_nowait 会抛 queue.Full
+    def enqueue_sentinel(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(self._sentinel)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    # 队列满时丢弃记录并计数，不阻塞调用线程；停止监听时报告丢弃数
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 只在调用线程里把消息参数展开；保留 exc_info，终端上 Rich 照样渲染 traceback。
+        # 队列只在进程内使用，不需要像默认实现那样为 pickle 去掉它
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
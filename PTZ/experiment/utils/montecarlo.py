@@ -0,0 +1,171 @@
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .logger import logger
+from .sig import add_noise, demodulate, gen_symbols, gen_up_chirp
+
+# Monte Carlo symbol/packet error rate sweeps over SNR x SF x BW.
+# Up-chirp templates are built once in the parent and shared with the workers
+# through multiprocessing.shared_memory, so each worker only generates symbols
+# and noise.
+
+_templates = {}  # (SF, BW) -> np.ndarray view into shared memory (worker side)
+_shms = []  # keep the worker-side SharedMemory handles alive
+
+
+def _attach_templates(layout: dict):
+    for key, (name, size) in layout.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shms.append(shm)
+        _templates[key] = np.ndarray((size,), dtype=np.complex64, buffer=shm.buf)
+
+
+def _run_batch(SF: int, BW: float, SNR: float, packets: int, payload_len: int, seed: int):
+    np.random.seed(seed % 2**32)
+    up_chirp = _templates[(SF, BW)]
+    symbols = np.random.randint(0, 2**SF, size=(packets, payload_len))
+    frames = gen_symbols(up_chirp, SF, symbols)
+    noisy = add_noise(SNR, frames, sig_power=1.0, silent=True)
+    errors = demodulate(noisy, up_chirp, SF) != symbols
+    return int(errors.sum()), int(errors.any(axis=1).sum())
+
+
+def wilson_interval(errors: int, trials: int, z=1.96) -> tuple[float, float]:
+    if trials == 0:
+        return 0.0, 1.0
+    p = errors / trials
+    denom = 1 + z**2 / trials
+    centre = (p + z**2 / (2 * trials)) / denom
+    half = z * np.sqrt(p * (1 - p) / trials + z**2 / (4 * trials**2)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def _converged(state: dict, rel_tol: float, min_errors: int, max_packets: int) -> bool:
+    if state["packets"] >= max_packets:
+        return True
+    if state["symbol_errors"] < min_errors:
+        return False
+    low, high = wilson_interval(state["symbol_errors"], state["symbols"])
+    ser = state["symbol_errors"] / state["symbols"]
+    return (high - low) / 2 <= rel_tol * ser
+
+
+def run_sweep(
+    snrs,
+    sfs,
+    bws,
+    output_path: str,
+    os_factor=1,
+    payload_len=16,
+    batch_packets=64,
+    rel_tol=0.1,
+    min_errors=100,
+    max_packets=20000,
+    workers=None,
+    seed=0,
+) -> list[dict]:
+    """
+    Sweep every (SNR, SF, BW) point until the 95% Wilson interval on the symbol
+    error rate is within rel_tol of the estimate (after at least min_errors symbol
+    errors), or max_packets packets have been simulated. Error-free points stop
+    at max_packets. Results are written to output_path as CSV.
+    """
+    layout = {}
+    shms = []
+    for SF, BW in itertools.product(sfs, bws):
+        up_chirp, _ = gen_up_chirp(BW * os_factor, SF, BW)
+        up_chirp = up_chirp.astype(np.complex64)
+        shm = shared_memory.SharedMemory(create=True, size=up_chirp.nbytes)
+        np.ndarray(up_chirp.shape, dtype=np.complex64, buffer=shm.buf)[:] = up_chirp
+        shms.append(shm)
+        layout[(SF, BW)] = (shm.name, up_chirp.size)
+
+    states = {
+        point: {"symbols": 0, "symbol_errors": 0, "packets": 0, "packet_errors": 0, "done": False}
+        for point in itertools.product(snrs, sfs, bws)
+    }
+    workers = workers or os.cpu_count()
+    seeds = itertools.count(seed * 1_000_003)
+    start_time = time.time()
+    logger.info(f"Monte Carlo sweep: {len(states)} points on {workers} workers")
+    try:
+        with ProcessPoolExecutor(workers, initializer=_attach_templates, initargs=(layout,)) as pool:
+            pending = {}
+
+            def submit(point):
+                SNR, SF, BW = point
+                future = pool.submit(_run_batch, SF, BW, SNR, batch_packets, payload_len, next(seeds))
+                pending[future] = point
+
+            # keep roughly two batches per worker in flight, spread over the grid
+            for point in itertools.islice(itertools.cycle(states), 2 * workers):
+                submit(point)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    point = pending.pop(future)
+                    state = states[point]
+                    symbol_errors, packet_errors = future.result()
+                    state["symbols"] += batch_packets * payload_len
+                    state["symbol_errors"] += symbol_errors
+                    state["packets"] += batch_packets
+                    state["packet_errors"] += packet_errors
+                    if not state["done"] and _converged(state, rel_tol, min_errors, max_packets):
+                        state["done"] = True
+                        logger.info(
+                            f"SNR={point[0]} SF={point[1]} BW={point[2]}: "
+                            f"SER={state['symbol_errors'] / state['symbols']:.3e} after {state['packets']} packets"
+                        )
+                    if not state["done"]:
+                        submit(point)
+                    else:
+                        # hand the freed slot to the point with the fewest packets so far
+                        open_points = [p for p, s in states.items() if not s["done"]]
+                        if open_points:
+                            submit(min(open_points, key=lambda p: states[p]["packets"]))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    results = []
+    for (SNR, SF, BW), state in states.items():
+        ser_low, ser_high = wilson_interval(state["symbol_errors"], state["symbols"])
+        results.append(
+            {
+                "SNR": SNR,
+                "SF": SF,
+                "BW": BW,
+                "symbols": state["symbols"],
+                "symbol_errors": state["symbol_errors"],
+                "SER": state["symbol_errors"] / state["symbols"],
+                "SER_low": ser_low,
+                "SER_high": ser_high,
+                "packets": state["packets"],
+                "packet_errors": state["packet_errors"],
+                "PER": state["packet_errors"] / state["packets"],
+            }
+        )
+    results.sort(key=lambda r: (r["SF"], r["BW"], r["SNR"]))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    logger.info(f"Saved {len(results)} points to {output_path!r} in {time.time() - start_time:.1f} s")
+    return results
+
+
+if __name__ == "__main__":
+    run_sweep(
+        snrs=np.arange(-20, -4, 1),
+        sfs=[7, 8, 9, 10],
+        bws=[125e3, 250e3],
+        output_path="ser_waterfall.csv",
+    )
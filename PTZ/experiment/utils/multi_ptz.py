@@ -0,0 +1,176 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .instrument import LatencyHistogram
+from .logger import logger
+from .pass_plan import PassPlan
+from .ptz_command import azimuth_command, elevation_command, encode_packet
+
+# 多云台控制：一个进程、一个 asyncio 事件循环、一个 UDP socket 管理多台云台。
+# 回包按 (来源IP, 端口) 和 Pelco-D 地址字节分发给对应云台，每台云台用自己的
+# 协程和绝对截止时间按各自的过境计划下发角度，不会因为某台云台等待回包而阻塞其他云台。
+# 晚了一个周期以上的点(起步晚于升起，或事件循环被卡住)按 TickScheduler 的 skip 策略丢弃，
+# 直接发当前应发的点，不会把错过的点连续补发给云台。
+
+
+class Gimbal:
+    def __init__(self, name, ip, port, add, plan: PassPlan | None = None, az_offset=0.0):
+        self.name = name
+        self.addr = (ip, port)
+        self.add = add
+        self.plan = plan
+        self.az_offset = az_offset
+        self.sent = 0
+        self.acked = 0
+        self.late_ticks = 0
+        self.skipped = 0
+        self.rtt = LatencyHistogram()
+        self._pending = {}  # cmd2 -> send time (loop.time())
+        self.last_reply = None
+
+    @property
+    def key(self):
+        return self.addr, self.add
+
+    def on_packet(self, packet: bytes, now: float):
+        self.last_reply = packet
+        if len(packet) < 4 or packet[3] not in (0x4B, 0x4D):
+            return
+        self.acked += 1
+        if packet[3] in self._pending:
+            self.rtt.record((now - self._pending.pop(packet[3])) * 1e9)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "sent": self.sent,
+            "acked": self.acked,
+            "late_ticks": self.late_ticks,
+            "skipped": self.skipped,
+            "rtt": self.rtt.summary(),
+        }
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, controller):
+        self.controller = controller
+
+    def datagram_received(self, data, addr):
+        self.controller._dispatch(data, addr)
+
+    def error_received(self, exc):
+        logger.warning(f"UDP error: {exc}")
+
+
+class MultiPTZController:
+    """
+    Drive many gimbals from one event loop and one UDP socket.
+
+    add_gimbal() registers a unit (IP, port, Pelco-D address, PassPlan);
+    run() tracks every registered plan concurrently, each on its own
+    absolute deadlines, and returns per-gimbal ack statistics.
+    """
+
+    def __init__(self, local_ip="0.0.0.0", local_port=0):
+        self.local_addr = (local_ip, local_port)
+        self.gimbals = {}
+        self.unknown_packets = 0
+        self._transport = None
+        self._loop = None
+
+    def add_gimbal(self, name, ip, port, add, plan=None, az_offset=0.0) -> Gimbal:
+        gimbal = Gimbal(name, ip, port, add, plan, az_offset)
+        if gimbal.key in self.gimbals:
+            raise ValueError(f"Gimbal {ip}:{port} address {add:#04x} is already registered")
+        self.gimbals[gimbal.key] = gimbal
+        return gimbal
+
+    def _dispatch(self, data, addr):
+        gimbal = self.gimbals.get((addr[:2], data[1] if len(data) > 1 else None))
+        if gimbal is None:
+            self.unknown_packets += 1
+            return
+        gimbal.on_packet(data, self._loop.time())
+
+    def send(self, gimbal: Gimbal, command_data):
+        self._transport.sendto(encode_packet(command_data, gimbal.add), gimbal.addr)
+        gimbal._pending[command_data[1]] = self._loop.time()
+        gimbal.sent += 1
+
+    def point(self, gimbal: Gimbal, azimuth, elevation):
+        self.send(gimbal, azimuth_command((azimuth - gimbal.az_offset) % 360))
+        self.send(gimbal, elevation_command(elevation))
+
+    async def _track(self, gimbal: Gimbal, wait_for_rise: bool):
+        plan = gimbal.plan
+        tick = plan.tick_time / 1000.0
+        # 把过境计划的 UTC 时间映射到事件循环的单调时钟上
+        if wait_for_rise:
+            start = self._loop.time() + (plan.t0 - datetime.now(timezone.utc).timestamp())
+            self.point(gimbal, plan.azimuths[0], plan.elevations[0])  # 提前转到升起位置
+        else:
+            start = self._loop.time()
+        i = 0
+        while i < len(plan):
+            deadline = start + i * tick
+            delay = deadline - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay <= -tick:
+                gimbal.late_ticks += 1
+                missed = int(-delay // tick)
+                gimbal.skipped += min(missed, len(plan) - i)
+                i += missed
+                if i >= len(plan):
+                    break
+            self.point(gimbal, plan.azimuths[i], plan.elevations[i])
+            i += 1
+        logger.info(f"{gimbal.name}: finished pass, {gimbal.stats()}")
+
+    async def run(self, wait_for_rise=True) -> list[dict]:
+        self._loop = asyncio.get_running_loop()
+        self._transport, _ = await self._loop.create_datagram_endpoint(
+            lambda: _Protocol(self), local_addr=self.local_addr
+        )
+        try:
+            tasks = [self._track(g, wait_for_rise) for g in self.gimbals.values() if g.plan is not None]
+            logger.info(f"Tracking {len(tasks)} gimbals from one event loop")
+            await asyncio.gather(*tasks)
+            await asyncio.sleep(0.2)  # 收齐最后的回包
+        finally:
+            self._transport.close()
+        return [g.stats() for g in self.gimbals.values()]
+
+
+if __name__ == "__main__":
+    # 规模测试：N 台模拟云台，每台一条独立的合成过境轨迹
+    import argparse
+
+    from .ptz_sim import PTZSimulator
+
+    parser = argparse.ArgumentParser(description="Multi-gimbal tracking against local simulators")
+    parser.add_argument("-n", type=int, default=24)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--tick", type=int, default=200)
+    args = parser.parse_args()
+
+    sims = [PTZSimulator(port=0, add=1 + i % 4, seed=i).start() for i in range(args.n)]
+    controller = MultiPTZController("127.0.0.1")
+    samples = int(args.duration * 1000 / args.tick)
+    t = np.arange(samples) * args.tick / 1000.0
+    for i, sim in enumerate(sims):
+        plan = PassPlan(datetime.now(timezone.utc), args.tick, 10 + 2 * t, (30 * i + 1.5 * t) % 360)
+        controller.add_gimbal(f"ptz{i}", *sim.addr, sim.add, plan)
+    started = time.perf_counter()
+    stats = asyncio.run(controller.run(wait_for_rise=False))
+    elapsed = time.perf_counter() - started
+    for sim in sims:
+        sim.stop()
+    acked = sum(s["acked"] for s in stats)
+    sent = sum(s["sent"] for s in stats)
+    late = sum(s["late_ticks"] for s in stats)
+    skipped = sum(s["skipped"] for s in stats)
+    logger.info(f"{args.n} gimbals, {elapsed:.1f} s: {acked}/{sent} acked, {late} late ticks, {skipped} points skipped")
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import numpy as np
+
+
+class PassPlan:
+    """
+    Precomputed pointing for one pass: one (azimuth, elevation) sample every
+    tick_time milliseconds starting at rise_time, as returned by
+    ground_station.get_satellite_position_angle().
+    """
+
+    def __init__(
+        self,
+        rise_time: datetime,
+        tick_time: int,
+        elevations: np.ndarray,
+        azimuths: np.ndarray,
+        max_elevation: float | None = None,
+    ):
+        self.rise_time = rise_time
+        self.tick_time = tick_time
+        self.elevations = np.asarray(elevations, dtype=np.float64)
+        self.azimuths = np.asarray(azimuths, dtype=np.float64)
+        self.max_elevation = float(np.max(self.elevations)) if max_elevation is None else max_elevation
+        self.t0 = rise_time.timestamp()
+        self.times = self.t0 + np.arange(self.elevations.size) * (tick_time / 1000.0)
+        # unwrapped azimuth so interpolation and rates do not jump at 0/360
+        self._az_unwrapped = np.degrees(np.unwrap(np.radians(self.azimuths)))
+
+    def __len__(self) -> int:
+        return self.elevations.size
+
+    @property
+    def set_time(self) -> float:
+        return float(self.times[-1])
+
+    def index_at(self, t: float) -> int:
+        return int(np.clip(round((t - self.t0) * 1000.0 / self.tick_time), 0, len(self) - 1))
+
+    def at(self, t: float | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # linear interpolation between samples, t in unix seconds
+        az = np.interp(t, self.times, self._az_unwrapped) % 360
+        el = np.interp(t, self.times, self.elevations)
+        return az, el
+
+    def rates(self) -> tuple[np.ndarray, np.ndarray]:
+        # angular rates in degrees per second at each sample
+        dt = self.tick_time / 1000.0
+        return np.gradient(self._az_unwrapped, dt), np.gradient(self.elevations, dt)
@@ -0,0 +1,186 @@
+import glob
+import json
+import os
+from datetime import datetime, timezone
+from os.path import join, relpath
+
+import numpy as np
+
+from .logger import logger
+from .pass_plan import PassPlan
+from .telemetry import TelemetryRecord
+
+# 过境记录库：每次过境一个列式 .npz(计划轨迹、回读角度、逐 tick 时序、遥测、IQ 文件引用)，
+# 再加一个一行一次过境的索引 index.jsonl(卫星、升起时间、最高仰角、跟踪误差、命令确认等指标)。
+# 查询和统计只读索引，不需要打开每次过境的数据文件。
+
+INDEX_NAME = "index.jsonl"
+
+_TELEMETRY_FIELDS = tuple(name for name in TelemetryRecord.__slots__ if name != "t")
+
+
+def _telemetry_columns(records) -> dict:
+    # None -> NaN，每个字段一列 float64
+    columns = {}
+    for name in _TELEMETRY_FIELDS:
+        values = [getattr(rec, name) for rec in records]
+        columns[f"telemetry_{name}"] = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    return columns
+
+
+class PassStore:
+    """
+    Directory of per-pass records plus an append-only index.
+
+    save_pass() writes <root>/<satellite>/<rise>.npz and appends one summary
+    row to <root>/index.jsonl; query() filters the index rows and
+    aggregate() reduces one numeric field over them; load() reads the
+    columns of a single pass back.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index_path = join(root, INDEX_NAME)
+        self._rows = None
+        self._rows_mtime = None
+
+    def save_pass(
+        self,
+        plan: PassPlan,
+        satellite,
+        recorder=None,
+        profiler=None,
+        scheduler=None,
+        telemetry=(),
+        iq_files=(),
+        acks=None,
+        **meta,
+    ) -> dict:
+        pass_id = f"{plan.rise_time:%Y%m%dT%H%M%S}"
+        pass_dir = join(self.root, str(satellite))
+        os.makedirs(pass_dir, exist_ok=True)
+        path = join(pass_dir, f"{pass_id}.npz")
+
+        row = {
+            "id": f"{satellite}/{pass_id}",
+            "satellite": str(satellite),
+            "rise_time": plan.rise_time.astimezone(timezone.utc).isoformat(),
+            "rise_ts": plan.t0,
+            "set_ts": plan.set_time,
+            "max_elevation": float(plan.max_elevation),
+            "tick_time": plan.tick_time,
+            "samples": len(plan),
+            "path": relpath(path, self.root),
+            "iq_files": [relpath(p, self.root) if os.path.isabs(p) else p for p in iq_files],
+            "telemetry_records": len(telemetry),
+            **meta,
+        }
+        columns = {
+            "plan_t": plan.times,
+            "plan_az": plan.azimuths.astype(np.float32),
+            "plan_el": plan.elevations.astype(np.float32),
+        }
+        if recorder is not None:
+            for name, col in recorder.columns().items():
+                columns[f"readback_{name}"] = col
+            row.update({k: v for k, v in recorder.summary().items()})
+        if profiler is not None and profiler.stages:
+            n = profiler.tick + 1
+            columns["timing_stages"] = np.array(profiler.stages)
+            columns["timing_ns"] = profiler.durations[:n]
+            summary = profiler.summary()
+            for stage in profiler.stages:
+                if stage in summary:
+                    row[f"{stage}_p99_us"] = summary[stage]["p99_us"]
+        if scheduler is not None:
+            columns["tick_lateness_ns"] = scheduler.lateness[: scheduler.released]
+            row.update({f"tick_{k}": v for k, v in scheduler.summary().items() if k != "ticks"})
+            row["ticks"] = scheduler.released
+        if acks is not None:
+            # 定位命令发出/确认数和确认往返时间，便于按 acks_lost 查丢包的过境
+            row.update(acks.summary())
+        if len(telemetry):
+            columns["telemetry_t"] = np.array([rec.t for rec in telemetry], dtype=np.float64)
+            columns.update(_telemetry_columns(telemetry))
+        columns["iq_files"] = np.array(row["iq_files"], dtype=str)
+        columns["index_row"] = np.array(json.dumps(row, ensure_ascii=False))
+
+        np.savez_compressed(path, **columns)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        logger.info(f"Saved pass {row['id']} to {path!r}")
+        return row
+
+    def rows(self) -> list[dict]:
+        # 索引文件未改动时复用上次读取的结果
+        if not os.path.exists(self.index_path):
+            return []
+        mtime = os.stat(self.index_path).st_mtime_ns
+        if self._rows is None or mtime != self._rows_mtime:
+            rows = {}
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        row = json.loads(line)
+                        rows[row["id"]] = row  # 同一次过境重复保存时以最后一次为准
+            self._rows = sorted(rows.values(), key=lambda r: r["rise_ts"])
+            self._rows_mtime = mtime
+        return self._rows
+
+    def query(self, satellite=None, since=None, until=None, min_elevation=None, where=None) -> list[dict]:
+        # since/until: datetime 或 unix 秒; where: 额外的 row -> bool 过滤函数
+        since = since.timestamp() if isinstance(since, datetime) else since
+        until = until.timestamp() if isinstance(until, datetime) else until
+        result = []
+        for row in self.rows():
+            if satellite is not None and row["satellite"] != str(satellite):
+                continue
+            if since is not None and row["rise_ts"] < since:
+                continue
+            if until is not None and row["rise_ts"] >= until:
+                continue
+            if min_elevation is not None and row["max_elevation"] < min_elevation:
+                continue
+            if where is not None and not where(row):
+                continue
+            result.append(row)
+        return result
+
+    def column(self, field: str, rows=None) -> np.ndarray:
+        rows = self.rows() if rows is None else rows
+        return np.array([row.get(field, np.nan) for row in rows], dtype=np.float64)
+
+    def aggregate(self, field: str, rows=None) -> dict:
+        values = self.column(field, rows)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return {"count": 0}
+        return {
+            "count": int(values.size),
+            "mean": float(values.mean()),
+            "median": float(np.median(values)),
+            "p95": float(np.percentile(values, 95)),
+            "min": float(values.min()),
+            "max": float(values.max()),
+        }
+
+    def load(self, row_or_id) -> dict:
+        row = row_or_id if isinstance(row_or_id, dict) else next(r for r in self.rows() if r["id"] == row_or_id)
+        with np.load(join(self.root, row["path"])) as data:
+            return {name: data[name] for name in data.files}
+
+    def reindex(self) -> int:
+        # 索引丢失或损坏时，从各次过境文件里保存的 index_row 重建
+        rows = []
+        for path in sorted(glob.glob(join(self.root, "*", "*.npz"))):
+            with np.load(path) as data:
+                if "index_row" in data.files:
+                    rows.append(json.loads(str(data["index_row"])))
+        rows.sort(key=lambda r: r["rise_ts"])
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._rows = None
+        logger.info(f"Rebuilt pass index with {len(rows)} passes")
+        return len(rows)
@@ -1,7 +1,8 @@
 from socket import *
 import time
 import binascii
-from .logger import logger
+from .logger import logger, packet_logger
+from .instrument import NULL_PROFILER
 
 #各类所需协议对照表
 work_mode_dict = { # 输出对应的工作模式
@@ -28,6 +29,10 @@ work_mode_dict = { # 输出对应的工作模式
     0xfe: "所有电机故障无法转动",
     0x00: "常规正常模式"
 }
+# 方向控制速度字节(0x00-0x3F)与角速度的换算，需按实际云台标定
+SPEED_DEG_PER_UNIT = 0.1 # 速度字节每个单位对应的度/秒
+MAX_SPEED_UNIT = 0x3F
+
 response_dict = { # 回复工作状态目录
     0x21: "水平电机状态",
     0x22: "水平霍尔传感器状态",
@@ -48,19 +53,43 @@ def init_udp_connection(ip='192.168.8.200', port=6666, local_ip= '192.168.8.222'
     sock.bind(local_addr)  # 绑定本地IP和端口
     return sock, (ip, port)
 
-# 发送PELCO-D协议
-def send_command(sock, addr, command_data, add, message=False):
+# 组PELCO-D数据包
+def encode_packet(command_data, add) -> bytes:
     start_byte = 0xFF
-    # add = 0x01  # 云台的独特地址，固定为1
     checksum = (add + sum(command_data)) & 0x00FF
-    packet = [start_byte, add] + command_data + [checksum]
-    packet_hex_str = ''.join(f'{byte:02x}  ' for byte in packet)  # 打印即将发送的数据包为16进制字符串格式
-    if message:
-        print(f"Sending packet: {packet_hex_str}")
+    return bytes([start_byte, add] + command_data + [checksum])
+
+# 水平角度指令数据
+def azimuth_command(azimuth):
+    h_angle_value = int(azimuth * 100)  # 角度放大100倍并取整
+    h_high = (h_angle_value >> 8) & 0xFF  # 高八位
+    h_low = h_angle_value & 0xFF  # 低八位
+    return [0x00, 0x4b, h_high, h_low]
+
+# 垂直角度指令数据
+def elevation_command(elevation):
+    v_angle = elevation - 90
+    v_angle_value = int(v_angle * 100)  # 角度放大100倍并取整
+    if v_angle_value < 0:
+        v_angle_value = -v_angle_value ^ 0xFFFF
+        v_angle_value = v_angle_value + 1 # 计算16位补码表示
+    v_high = (v_angle_value >> 8) & 0xFF  # 高八位
+    v_low = v_angle_value & 0xFF  # 低八位
+    return [0x00, 0x4d, v_high, v_low]
+
+# 发送PELCO-D协议
+def send_command(sock, addr, command_data, add, message=False, profiler=NULL_PROFILER):
+    # add = 0x01  # 云台的独特地址，固定为1
+    t = profiler.now()
+    packet = encode_packet(command_data, add)
+    t = profiler.lap("encode", t)
     try:
-        sock.sendto(bytearray(packet), addr)
+        sock.sendto(packet, addr)
     except Exception as e:
-        print(f"发送数据包时发生错误: {e}")
+        logger.error(f"发送数据包时发生错误: {e}")
+    t = profiler.lap("sendto", t)
+    if message:
+        packet_logger.info("Sending packet: %s", packet.hex(" "))  # 数据包的16进制字符串
     # time.sleep(0.1)
   
 # 查询工作模式
@@ -171,47 +200,75 @@ def query_temperature(sock, addr, add):
     return None
 
 # 角度定位
-def set_angle_position(sock, addr, add, elevation=None, azimuth=None, message=False):
+def set_angle_position(sock, addr, add, elevation=None, azimuth=None, message=False, profiler=NULL_PROFILER, acks=None):
+    # acks: 可选的 AckStats，记录每条定位命令是否收到确认及往返时间
     if azimuth is not None:
         # 水平角度指令
-        h_angle = azimuth
-        h_angle_value = int(h_angle * 100)  # 角度放大100倍并取整
-        h_high = (h_angle_value >> 8) & 0xFF  # 高八位
-        h_low = h_angle_value & 0xFF  # 低八位
-        command_data = [0x00, 0x4b, h_high, h_low]  # 垂直角度指令
+        command_data = azimuth_command(azimuth)
         if message:
-            print()
-            print(f"水平角度定位 {azimuth:.2f}°",end=' >>> ')
-        send_command(sock, addr, command_data, add, message)
+            packet_logger.info("水平角度定位 %.2f°", azimuth)
+        sent = time.perf_counter_ns()
+        send_command(sock, addr, command_data, add, message, profiler)
         sock.settimeout(5.0)
+        t = profiler.now()
+        rtt = None
         try:
             response, _ = sock.recvfrom(1024)
+            rtt = time.perf_counter_ns() - sent
             if message:
-                print(f"Recvfrom packet: {''.join(f'{byte:02x}  ' for byte in response)}")
+                packet_logger.info("Recvfrom packet: %s", response.hex(" "))
         except timeout:
-            print("接收水平角度定位确认超时")
+            logger.warning("接收水平角度定位确认超时")
+        profiler.lap("ack", t)
+        if acks is not None:
+            acks.record(rtt)
 
     if elevation is not None:
         # 垂直角度指令
-        v_angle = elevation - 90
-        v_angle_value = int(v_angle * 100)  # 角度放大100倍并取整
-        if v_angle_value < 0:
-            v_angle_value = -v_angle_value ^ 0xFFFF
-            v_angle_value = v_angle_value + 1 # 计算16位补码表示
-        v_high = (v_angle_value >> 8) & 0xFF  # 高八位
-        v_low = v_angle_value & 0xFF  # 低八位
-        command_data = [0x00, 0x4d, v_high, v_low]  # 垂直角度指令
+        command_data = elevation_command(elevation)
         if message:
-            print()
-            print(f"垂直角度定位 {elevation:.2f}°",end=' >>> ')
-        send_command(sock, addr, command_data, add, message)
+            packet_logger.info("垂直角度定位 %.2f°", elevation)
+        sent = time.perf_counter_ns()
+        send_command(sock, addr, command_data, add, message, profiler)
         sock.settimeout(5.0)
+        t = profiler.now()
+        rtt = None
         try:
             response, _ = sock.recvfrom(1024)
+            rtt = time.perf_counter_ns() - sent
             if message:
-                print(f"Recvfrom packet: {''.join(f'{byte:02x}  ' for byte in response)}")
+                packet_logger.info("Recvfrom packet: %s", response.hex(" "))
+        except timeout:
+            logger.warning("接收垂直角度定位确认超时")
+        profiler.lap("ack", t)
+        if acks is not None:
+            acks.record(rtt)
+
+# 角度查询 (Pelco-D 0x51/0x53，回复 0x59/0x5B)
+def query_angle_position(sock, addr, add, timeout_s=1.0):
+    angles = {}
+    for query, reply in ((0x51, 0x59), (0x53, 0x5B)):
+        send_command(sock, addr, [0x00, query, 0x00, 0x00], add)
+        sock.settimeout(timeout_s)
+        deadline = time.monotonic() + timeout_s
+        try:
+            # 跳过迟到的角度定位确认等其他回包，直到收到对应的角度回复
+            while time.monotonic() < deadline:
+                response, _ = sock.recvfrom(1024)
+                if len(response) >= 6 and response[3] == reply:
+                    angles[reply] = (response[4] << 8) + response[5]
+                    break
         except timeout:
-            print("接收垂直角度定位确认超时")
+            pass
+        if reply not in angles:
+            logger.warning("接收角度查询回复超时")
+            return None
+    azimuth = angles[0x59] / 100.0
+    v_angle_value = angles[0x5B]
+    if v_angle_value & 0x8000:
+        v_angle_value -= 0x10000  # 16位补码
+    elevation = v_angle_value / 100.0 + 90
+    return azimuth, elevation
 
 
 # 云台自检
@@ -220,7 +277,7 @@ def full_self_check(sock, addr, add):
     send_command(sock, addr, command_data, add)
 
 # 方向控制  
-def direction_control(sock, addr, command_type, add, h_speed=0x00, v_speed=0x00):
+def direction_control(sock, addr, command_type, add, h_speed=0x00, v_speed=0x00, profiler=NULL_PROFILER):
     # 根据输入的0-7指令类型确定控制方向的命令
     directions = {
         0: [0x00, 0x00, 0x00, 0x00],  # 停止
@@ -235,9 +292,9 @@ def direction_control(sock, addr, command_type, add, h_speed=0x00, v_speed=0x00)
     }
     if command_type in directions:
         command_data = directions[command_type]
-        send_command(sock, addr, command_data, add)
+        send_command(sock, addr, command_data, add, profiler=profiler)
     else:
-        print("无效的方向指令类型，必须在0-7之间")
+        logger.error("无效的方向指令类型，必须在0-8之间")
 
 # 改变云台地址（慎用！！）
 def modify_ptz_address(sock, addr):
@@ -0,0 +1,291 @@
+import heapq
+import random
+import threading
+import time
+from socket import AF_INET, SOCK_DGRAM, socket, timeout
+
+import numpy as np
+
+from .logger import logger
+from .ptz_command import SPEED_DEG_PER_UNIT
+
+# 本地云台模拟器：在 UDP 上实现 ptz_command.py 用到的 Pelco-D 扩展指令，
+# 模拟转速/加速度、回包延迟、丢包和乱序，并记录云台实际到达的指向，
+# 用于在没有真实云台(192.168.8.200)的机器上复现端到端测试。
+#
+# 数据包格式与 send_command 一致: FF add cmd1 cmd2 data1 data2 checksum
+
+# 方向控制 cmd2 各位 (参考 direction_control)
+DIR_RIGHT = 0x02
+DIR_LEFT = 0x04
+DIR_UP = 0x08
+DIR_DOWN = 0x10
+
+
+def _frame(add, cmd1, cmd2, data1, data2) -> bytes:
+    checksum = (add + cmd1 + cmd2 + data1 + data2) & 0xFF
+    return bytes([0xFF, add, cmd1, cmd2, data1, data2, checksum])
+
+
+def _to_word(value) -> tuple[int, int]:
+    value = int(round(value)) & 0xFFFF  # 16位补码
+    return (value >> 8) & 0xFF, value & 0xFF
+
+
+def _from_word(high, low) -> int:
+    value = (high << 8) | low
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class _Axis:
+    __slots__ = ("pos", "vel", "target", "rate", "max_rate", "accel")
+
+    def __init__(self, pos, max_rate, accel):
+        self.pos = pos
+        self.vel = 0.0
+        self.target = pos
+        self.rate = None  # 不为 None 时为速度模式
+        self.max_rate = max_rate
+        self.accel = accel
+
+    def step(self, dt):
+        if self.rate is not None:
+            v_des = self.rate
+        else:
+            err = self.target - self.pos
+            # 梯形速度曲线：保证能在目标处以最大加速度刹停
+            v_des = np.sign(err) * min(self.max_rate, np.sqrt(2 * self.accel * abs(err)))
+        dv = np.clip(v_des - self.vel, -self.accel * dt, self.accel * dt)
+        self.vel = float(np.clip(self.vel + dv, -self.max_rate, self.max_rate))
+        self.pos += self.vel * dt
+        if self.rate is None and abs(self.target - self.pos) < 1e-3 and abs(self.vel) < self.accel * dt:
+            self.pos, self.vel = self.target, 0.0
+
+
+class PTZSimulator:
+    """
+    UDP gimbal simulator.
+
+    Supported: 0x4b/0x4d angle set (acked by echo), 0x51/0x53 angle query
+    (0x59/0x5b replies), direction control, 0xe0 work mode, 0xdd status burst
+    (13 frames) and 0xd6 temperature. The simulated pointing is integrated
+    every `dt` seconds and recorded together with the last commanded target.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=6666,
+        add=0x01,
+        max_rate=(30.0, 30.0),  # 水平/垂直最大转速，度/秒
+        accel=(60.0, 60.0),  # 度/秒^2
+        speed_per_unit=SPEED_DEG_PER_UNIT,  # 方向控制速度字节 1 对应的度/秒
+        ack_latency=0.005,
+        latency_jitter=0.002,
+        loss=0.0,
+        reorder=0.0,
+        dt=0.005,
+        temperature=25.0,
+        seed=0,
+    ):
+        self.addr = (host, port)
+        self.add = add
+        self.az = _Axis(0.0, max_rate[0], accel[0])
+        self.el = _Axis(0.0, max_rate[1], accel[1])
+        self.speed_per_unit = speed_per_unit
+        self.ack_latency = ack_latency
+        self.latency_jitter = latency_jitter
+        self.loss = loss
+        self.reorder = reorder
+        self.dt = dt
+        self.temperature = temperature
+        self.work_mode = 0x00
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._outbox = []  # (send_time, seq, frame, addr)
+        self._seq = 0
+        self._stop = threading.Event()
+        self._threads = []
+        self.sock = None
+        self.history = []  # (t, az, el, target_az, target_el)
+        self.commands = []  # (t, cmd1, cmd2)
+        self.stats = {"rx": 0, "tx": 0, "dropped_rx": 0, "dropped_tx": 0, "reordered": 0}
+
+    # --- 收发 ---
+    def _queue(self, frame, addr):
+        if self._rng.random() < self.loss:
+            self.stats["dropped_tx"] += 1
+            return
+        delay = self.ack_latency + self._rng.uniform(0, self.latency_jitter)
+        if self._rng.random() < self.reorder:
+            delay += 3 * (self.ack_latency + self.latency_jitter)  # 晚于后续回包到达
+            self.stats["reordered"] += 1
+        # 调用方已持有 self._lock
+        heapq.heappush(self._outbox, (time.monotonic() + delay, self._seq, frame, addr))
+        self._seq += 1
+
+    def _handle(self, packet, addr):
+        if len(packet) < 7 or packet[0] != 0xFF or packet[1] != self.add:
+            return
+        cmd1, cmd2, data1, data2 = packet[2], packet[3], packet[4], packet[5]
+        with self._lock:
+            if self._rng.random() < self.loss:
+                self.stats["dropped_rx"] += 1
+                return
+            self.stats["rx"] += 1
+            self.commands.append((time.monotonic(), cmd1, cmd2))
+            if cmd1 == 0xE0:
+                self._queue(_frame(self.add, 0xE0, self.work_mode, 0, 0), addr)
+            elif cmd1 == 0xDD:
+                for frame in self._status_frames():
+                    self._queue(frame, addr)
+            elif cmd1 == 0xD6:
+                self._queue(_frame(self.add, 0xD6, *_to_word(self.temperature * 100), 0), addr)
+            elif cmd1 == 0x00 and cmd2 == 0x4B:
+                self.az.rate = None
+                self.az.target = ((data1 << 8) | data2) / 100.0
+                self._queue(bytes(packet[:7]), addr)
+            elif cmd1 == 0x00 and cmd2 == 0x4D:
+                self.el.rate = None
+                self.el.target = _from_word(data1, data2) / 100.0 + 90
+                self._queue(bytes(packet[:7]), addr)
+            elif cmd1 == 0x00 and cmd2 == 0x51:
+                self._queue(_frame(self.add, 0x00, 0x59, *_to_word(self.az.pos % 360 * 100)), addr)
+            elif cmd1 == 0x00 and cmd2 == 0x53:
+                self._queue(_frame(self.add, 0x00, 0x5B, *_to_word((self.el.pos - 90) * 100)), addr)
+            elif cmd1 == 0x00 and cmd2 & ~(DIR_RIGHT | DIR_LEFT | DIR_UP | DIR_DOWN) == 0:
+                h = data1 * self.speed_per_unit
+                v = data2 * self.speed_per_unit
+                self.az.rate = h if cmd2 & DIR_RIGHT else -h if cmd2 & DIR_LEFT else 0.0
+                self.el.rate = v if cmd2 & DIR_UP else -v if cmd2 & DIR_DOWN else 0.0
+                if cmd2 == 0x00:
+                    # 停止：保持当前位置
+                    self.az.rate = self.el.rate = None
+                    self.az.target, self.el.target = self.az.pos, self.el.pos
+
+    def _status_frames(self):
+        az_dir = 4 if self.az.vel > 0 else 3
+        el_dir = 1 if self.el.vel > 0 else 2
+        return [
+            _frame(self.add, 0x21, 0, az_dir, int(self.az.vel != 0)),
+            _frame(self.add, 0x22, 0, 0, 0),
+            _frame(self.add, 0x23, 0, 0, 0),
+            _frame(self.add, 0x24, 0, el_dir, int(self.el.vel != 0)),
+            _frame(self.add, 0x25, 0, 0, 0),
+            _frame(self.add, 0x26, 0, 0, 0),
+            _frame(self.add, 0x27, 0, *_to_word(self.temperature * 100)),
+            _frame(self.add, 0x28, 0, *_to_word(24.0 * 100)),
+            _frame(self.add, 0x29, 1, 1, 0),
+            _frame(self.add, 0x2A, 0, *_to_word(1.2 * 100)),
+            _frame(self.add, 0x2B, 0, 0, 0),
+            _frame(self.add, 0x2C, 0, 0, 0),
+            _frame(self.add, 0x2F, 0, 0, 0),
+        ]
+
+    def _rx_loop(self):
+        while not self._stop.is_set():
+            try:
+                packet, addr = self.sock.recvfrom(1024)
+            except timeout:
+                continue
+            except OSError:
+                break
+            self._handle(packet, addr)
+
+    def _tx_and_motion_loop(self):
+        next_step = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                while self._outbox and self._outbox[0][0] <= now:
+                    _, _, frame, addr = heapq.heappop(self._outbox)
+                    try:
+                        self.sock.sendto(frame, addr)
+                        self.stats["tx"] += 1
+                    except OSError:
+                        pass
+                if now >= next_step:
+                    self.az.step(self.dt)
+                    self.el.step(self.dt)
+                    self.history.append((now, self.az.pos, self.el.pos, self.az.target, self.el.target))
+                    next_step += self.dt
+            time.sleep(min(self.dt, 0.001))
+
+    # --- 控制 ---
+    def start(self):
+        self.sock = socket(AF_INET, SOCK_DGRAM)
+        self.sock.bind(self.addr)
+        self.addr = self.sock.getsockname()
+        self.sock.settimeout(0.1)
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._rx_loop, name="ptz-sim-rx", daemon=True),
+            threading.Thread(target=self._tx_and_motion_loop, name="ptz-sim-tx", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"PTZ simulator listening on {self.addr}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        if self.sock is not None:
+            self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def trajectory(self) -> dict:
+        with self._lock:
+            history = list(self.history)
+        arr = np.array(history, dtype=np.float64).reshape(-1, 5)
+        return {"t": arr[:, 0], "az": arr[:, 1], "el": arr[:, 2], "target_az": arr[:, 3], "target_el": arr[:, 4]}
+
+    def save(self, path: str) -> str:
+        np.savez_compressed(path, **self.trajectory())
+        return path
+
+    def summary(self) -> dict:
+        traj = self.trajectory()
+        az_err = np.abs((traj["target_az"] - traj["az"] + 180) % 360 - 180)
+        el_err = np.abs(traj["target_el"] - traj["el"])
+        with self._lock:
+            cmd_t = np.array([c[0] for c in self.commands])
+            stats = dict(self.stats)
+        duration = cmd_t[-1] - cmd_t[0] if cmd_t.size > 1 else 0.0
+        return {
+            "commands": int(cmd_t.size),
+            "commands_per_second": float(cmd_t.size / duration) if duration > 0 else 0.0,
+            "az_err_mean": float(np.mean(az_err)) if az_err.size else 0.0,
+            "az_err_max": float(np.max(az_err)) if az_err.size else 0.0,
+            "el_err_mean": float(np.mean(el_err)) if el_err.size else 0.0,
+            "el_err_max": float(np.max(el_err)) if el_err.size else 0.0,
+            **stats,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local Pelco-D PTZ simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6666)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--record", default="ptz_sim.npz")
+    args = parser.parse_args()
+    sim = PTZSimulator(args.host, args.port, loss=args.loss, reorder=args.reorder, ack_latency=args.latency)
+    with sim:
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    sim.save(args.record)
+    logger.info(f"Saved trajectory to {args.record!r}: {sim.summary()}")
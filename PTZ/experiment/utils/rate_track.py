@@ -0,0 +1,166 @@
+import numpy as np
+
+from .instrument import NULL_PROFILER
+from .logger import logger
+from .pass_plan import PassPlan
+from .scheduler import TickScheduler
+from .ptz_command import (
+    MAX_SPEED_UNIT,
+    SPEED_DEG_PER_UNIT,
+    direction_control,
+    query_angle_position,
+    set_angle_position,
+)
+
+# 速度模式跟踪：把过境计划的角速度换算成方向控制(direction_control 5-8)的速度字节，
+# 只有在所需速度变化超过死区时才发送新指令；每隔 correction_period 秒回读一次角度，
+# 用速度偏置在 correction_horizon 秒内消除累积误差，之后偏置清零(回读失败时退回一次绝对位置定位)。
+# 速度字节最大 MAX_SPEED_UNIT，对应 MAX_RATE 度/秒，超过时(天顶附近的高仰角过境)云台会落后。
+
+MAX_RATE = MAX_SPEED_UNIT * SPEED_DEG_PER_UNIT  # 度/秒
+
+
+def quantize_rates(rates: np.ndarray) -> np.ndarray:
+    # 度/秒 -> 带符号的速度字节
+    units = np.rint(rates / SPEED_DEG_PER_UNIT)
+    return np.clip(units, -MAX_SPEED_UNIT, MAX_SPEED_UNIT).astype(np.int16)
+
+
+def saturated(rates: np.ndarray) -> np.ndarray:
+    # 超出速度字节范围、会被 quantize_rates 截断的速度
+    return np.abs(rates) > (MAX_SPEED_UNIT + 0.5) * SPEED_DEG_PER_UNIT
+
+
+def direction_type(h_units: int, v_units: int) -> int:
+    # 对应 direction_control 的指令类型: 0 停止, 1 上, 2 下, 3 左, 4 右, 5 左上, 6 右上, 7 左下, 8 右下
+    h = (h_units > 0) - (h_units < 0)
+    v = (v_units > 0) - (v_units < 0)
+    return {
+        (0, 0): 0,
+        (0, 1): 1,
+        (0, -1): 2,
+        (-1, 0): 3,
+        (1, 0): 4,
+        (-1, 1): 5,
+        (1, 1): 6,
+        (-1, -1): 7,
+        (1, -1): 8,
+    }[(h, v)]
+
+
+def _wrap180(x):
+    return (x + 180.0) % 360.0 - 180.0
+
+
+def track_pass_rate(
+    sock,
+    ptz_addr,
+    add,
+    plan: PassPlan,
+    az_offset=0.0,
+    deadband=1,
+    correction_period=10.0,
+    correction_horizon=5.0,
+    recorder=None,
+    profiler=NULL_PROFILER,
+    scheduler=None,
+    acks=None,
+) -> dict:
+    """
+    Track `plan` with speed commands instead of one absolute position per tick.
+
+    deadband: a new speed command is sent only when either axis differs from
+    the last sent speed by more than this many speed units; applying or
+    clearing a correction always sends.
+    correction_period: seconds between angle readbacks; the measured error is
+    removed over correction_horizon seconds (at most correction_period) by
+    biasing the commanded rate, then the bias is cleared.
+    Ticks whose rate exceeds MAX_RATE are clipped and logged as saturated.
+    Readings are added to `recorder` (a TrackingRecorder) and per-tick stage
+    timings to `profiler` (a TickProfiler) when given; ticks are released by
+    `scheduler` (a TickScheduler, default: sleep-only with overrun skipping).
+    Returns packet counts for the pass.
+    """
+    az_rate, el_rate = plan.rates()
+    tick = plan.tick_time / 1000.0
+    correct_every = max(1, round(correction_period / tick))
+    horizon = min(max(1, round(correction_horizon / tick)), correct_every)
+    az_bias = el_bias = 0.0
+    bias_until = 0  # 偏置作用到这个 tick 之前
+    last_h = last_v = None
+    last_correction = 0
+    packets = {"speed": 0, "readback": 0, "position": 0}
+    saturated_ticks = 0
+    in_saturation = False
+
+    plan_saturated = saturated(az_rate) | saturated(el_rate)
+    if plan_saturated.any():
+        peak = max(np.abs(az_rate).max(), np.abs(el_rate).max())
+        logger.warning(
+            f"Pass needs up to {peak:.1f}°/s but speed commands are capped at {MAX_RATE:.1f}°/s: "
+            f"{int(plan_saturated.sum())} of {len(plan)} ticks will be clipped and the gimbal will lag"
+        )
+
+    if scheduler is None:
+        scheduler = TickScheduler(tick, len(plan))
+    try:
+        for i in scheduler:
+            t = profiler.begin_tick()
+            profiler.add("sleep_overshoot", scheduler.last_lateness_ns)
+            force = False
+            if bias_until and i >= bias_until:
+                # 误差已在 horizon 内消除，偏置清零
+                az_bias = el_bias = 0.0
+                bias_until = 0
+                force = True
+            if i - last_correction >= correct_every:
+                last_correction = i
+                plan_az, plan_el = plan.azimuths[i] - az_offset, plan.elevations[i]
+                t = profiler.now()
+                actual = query_angle_position(sock, ptz_addr, add)
+                profiler.lap("readback", t)
+                packets["readback"] += 2
+                if actual is not None:
+                    if recorder is not None:
+                        recorder.add(plan.t0 + scheduler.elapsed(), *actual)
+                    span = horizon * tick
+                    az_bias = _wrap180(plan_az - actual[0]) / span
+                    el_bias = (plan_el - actual[1]) / span
+                    bias_until = i + horizon
+                    force = True
+                else:
+                    # 回读失败：绝对定位一次，并强制下一次重新下发速度
+                    set_angle_position(sock, ptz_addr, add, plan_el, plan_az % 360, profiler=profiler, acks=acks)
+                    packets["position"] += 2
+                    az_bias = el_bias = 0.0
+                    bias_until = 0
+                    last_h = last_v = None
+
+            t = profiler.now()
+            rates = np.array([az_rate[i] + az_bias, el_rate[i] + el_bias])
+            h_units, v_units = (int(u) for u in quantize_rates(rates))
+            profiler.lap("ephemeris", t)
+            if saturated(rates).any():
+                saturated_ticks += 1
+                if not in_saturation:
+                    logger.warning(f"Speed saturated at tick {i}: need ({rates[0]:+.2f}, {rates[1]:+.2f})°/s, max {MAX_RATE:.1f}°/s")
+                in_saturation = True
+            elif in_saturation:
+                logger.info(f"Speed back in range at tick {i}")
+                in_saturation = False
+            if force or last_h is None or abs(h_units - last_h) > deadband or abs(v_units - last_v) > deadband:
+                direction_control(
+                    sock, ptz_addr, direction_type(h_units, v_units), add, abs(h_units), abs(v_units), profiler=profiler
+                )
+                packets["speed"] += 1
+                last_h, last_v = h_units, v_units
+    finally:
+        # 异常或中断时也要停下，否则云台会按最后一次的速度一直转
+        direction_control(sock, ptz_addr, 0, add)
+        packets["speed"] += 1
+    total = sum(packets.values())
+    logger.info(
+        f"Rate tracking sent {total} packets ({packets}) vs {2 * len(plan)} in position mode"
+        + (f", {saturated_ticks} ticks speed-saturated" if saturated_ticks else "")
+    )
+    return packets
@@ -0,0 +1,95 @@
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+
+@lru_cache(maxsize=32)
+def design_lowpass(up: int, down: int, taps_per_phase=32, beta=8.0) -> np.ndarray:
+    # Kaiser-windowed sinc at the upsampled rate, cut off at the lower of the
+    # input/output Nyquist frequencies (with 10% transition band), gain `up`
+    # to make up for the zeros inserted by upsampling. An even-length filter is
+    # designed one tap shorter and padded with a zero, so the group delay
+    # (num_taps - 1) // 2 is a whole number of upsampled samples
+    num_taps = taps_per_phase * up
+    length = num_taps - 1 + num_taps % 2
+    fc = 0.45 / max(up, down)  # cycles per upsampled sample
+    n = np.arange(length) - (length - 1) / 2
+    h = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(length, beta)
+    h *= up / np.sum(h)
+    h = np.concatenate((h, np.zeros(num_taps - length)))
+    h = h.astype(np.float32)
+    h.flags.writeable = False
+    return h
+
+
+@lru_cache(maxsize=32)
+def _polyphase_taps(up: int, down: int, taps_per_phase: int, beta: float) -> np.ndarray:
+    # row p holds the taps for output phase p, reversed so that row . x[base-K+1 : base+1]
+    # is the convolution sum
+    h = design_lowpass(up, down, taps_per_phase, beta)
+    phases = h.reshape(taps_per_phase, up).T[:, ::-1].copy()
+    phases.flags.writeable = False
+    return phases
+
+
+class Resampler:
+    """
+    Streaming rational resampler (up / down) with a polyphase FIR.
+
+    Only the taps that hit non-zero upsampled samples are evaluated, and only
+    for the outputs that are kept, so decimating by D costs taps_per_phase
+    multiply-adds per output sample. The last taps_per_phase - 1 input samples
+    are carried between push() calls, so chunked and one-shot processing give
+    identical output. Output is delayed by (taps_per_phase * up - 1) // 2
+    upsampled samples (the filter's group delay) unless compensate_delay is
+    set: then output m is taken that many upsampled samples later, so it
+    lines up with the input, and each output waits for the extra input.
+    """
+
+    def __init__(self, up: int, down: int, taps_per_phase=32, beta=8.0, compensate_delay=False):
+        g = gcd(up, down)
+        self.up = up // g
+        self.down = down // g
+        self.taps = _polyphase_taps(self.up, self.down, taps_per_phase, beta)
+        self.K = taps_per_phase
+        self.offset = (taps_per_phase * self.up - 1) // 2 if compensate_delay else 0  # upsampled samples
+        self.reset()
+
+    def reset(self):
+        self._hist = np.zeros(self.K - 1, dtype=np.complex64)
+        self._consumed = 0  # absolute input samples seen
+        self._m = 0  # absolute index of the next output sample
+
+    def push(self, chunk: np.ndarray) -> np.ndarray:
+        chunk = np.asarray(chunk)
+        buf = np.concatenate((self._hist, chunk))
+        buf_start = self._consumed - (self.K - 1)  # absolute input index of buf[0]
+        in_end = self._consumed + chunk.size
+        # output m needs input (m * down + offset) // up, so stop before it runs past in_end
+        m_end = max(0, (in_end * self.up - self.offset + self.down - 1) // self.down)
+        n_out = max(0, m_end - self._m)
+        out = np.zeros(n_out, dtype=np.result_type(buf.dtype, np.complex64))
+        for r in range(min(self.up, n_out)):
+            n0 = (self._m + r) * self.down + self.offset  # upsampled index of this output
+            phase = n0 % self.up
+            base = n0 // self.up - buf_start  # newest input sample used
+            count = len(range(r, n_out, self.up))
+            stride = self.down  # consecutive outputs of one phase are `down` inputs apart
+            acc = out[r :: self.up]
+            for k, tap in enumerate(self.taps[phase]):
+                start = base - (self.K - 1) + k
+                acc += tap * buf[start : start + stride * (count - 1) + 1 : stride]
+        if self.K > 1:
+            self._hist = buf[-(self.K - 1) :].astype(np.complex64)
+        self._consumed = in_end
+        self._m += n_out
+        return out if np.iscomplexobj(chunk) else out.real
+
+
+def resample(sig: np.ndarray, up: int, down: int, taps_per_phase=32) -> np.ndarray:
+    # one-shot: group delay compensated, zero-padded so the output keeps ceil(len * up / down) samples
+    resampler = Resampler(up, down, taps_per_phase, compensate_delay=True)
+    n_out = -(-sig.size * resampler.up // resampler.down)
+    pad = -(-resampler.offset // resampler.up)
+    return resampler.push(np.concatenate((sig, np.zeros(pad, dtype=sig.dtype))))[:n_out]
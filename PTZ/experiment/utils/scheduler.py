@@ -0,0 +1,148 @@
+import os
+import time
+
+import numpy as np
+
+from .logger import logger
+
+# 跟踪循环的节拍器：基于单调纳秒时钟，按绝对截止时间 start + i * period 唤醒，
+# 不受系统时间跳变影响，也不会因为每个 tick 的执行时间而累积漂移。
+# 截止时间前 spin 秒改为忙等，绕开 time.sleep 的调度粒度。
+
+monotonic_ns = time.monotonic_ns
+
+POLICIES = ("skip", "catchup", "stretch")
+
+
+def set_realtime(cpu=None, priority=None):
+    """
+    Pin the calling process to `cpu` and/or switch it to SCHED_FIFO at
+    `priority` (Linux only). Returns the previous (affinity, policy, param)
+    so restore_realtime() can undo it; failures are logged, not raised.
+    """
+    previous = (None, None, None)
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            previous = (os.sched_getaffinity(0), None, None)
+            os.sched_setaffinity(0, {cpu} if isinstance(cpu, int) else set(cpu))
+        except OSError as e:
+            logger.warning(f"Could not set CPU affinity to {cpu}: {e}")
+    if priority is not None and hasattr(os, "sched_setscheduler"):
+        try:
+            old_policy, old_param = os.sched_getscheduler(0), os.sched_getparam(0)
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            previous = (previous[0], old_policy, old_param)
+        except (OSError, PermissionError) as e:
+            logger.warning(f"Could not switch to SCHED_FIFO priority {priority} (needs CAP_SYS_NICE): {e}")
+    return previous
+
+
+def restore_realtime(previous):
+    affinity, policy, param = previous
+    try:
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+        if policy is not None:
+            os.sched_setscheduler(0, policy, param)
+    except OSError as e:
+        logger.warning(f"Could not restore scheduling settings: {e}")
+
+
+class TickScheduler:
+    """
+    Iterate over tick indices 0..n_ticks-1, each released at its absolute
+    deadline start + i * period on the monotonic clock.
+
+    When a tick is released a full period or more after its deadline the
+    overrun policy decides what happens:
+      skip    -- jump to the tick that is due now; missed indices are dropped
+      catchup -- release the missed ticks back to back until on time again
+      stretch -- shift the whole schedule so the late tick becomes on time
+
+    Wake-up lateness of every released tick is kept for summary().
+    """
+
+    def __init__(self, period_s: float, n_ticks: int, spin_s=0.0, policy="skip", cpu=None, priority=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy!r}, expected one of {POLICIES}")
+        self.period_ns = int(round(period_s * 1e9))
+        self.n_ticks = n_ticks
+        self.spin_ns = int(spin_s * 1e9)
+        self.policy = policy
+        self.cpu = cpu
+        self.priority = priority
+        self.start_ns = None
+        self.lateness = np.zeros(n_ticks, dtype=np.int64)
+        self.released = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_lateness_ns = 0
+        self.cancelled = False
+
+    def elapsed(self) -> float:
+        # seconds since the first tick, on the (possibly stretched) schedule
+        return (monotonic_ns() - self.start_ns) / 1e9
+
+    def cancel(self):
+        # 可从其他线程调用，循环在下一个 tick 前结束
+        self.cancelled = True
+
+    def _wait(self, deadline: int) -> int:
+        now = monotonic_ns()
+        remaining = deadline - now - self.spin_ns
+        if remaining > 0:
+            time.sleep(remaining / 1e9)
+        now = monotonic_ns()
+        while now < deadline:
+            now = monotonic_ns()
+        return now
+
+    def __iter__(self):
+        previous = set_realtime(self.cpu, self.priority)
+        try:
+            self.start_ns = monotonic_ns()
+            i = 0
+            while i < self.n_ticks:
+                deadline = self.start_ns + i * self.period_ns
+                late = self._wait(deadline) - deadline
+                if self.cancelled:
+                    break
+                if late >= self.period_ns:
+                    self.overruns += 1
+                    if self.policy == "skip":
+                        missed = late // self.period_ns
+                        i += missed
+                        self.skipped += missed
+                        late -= missed * self.period_ns
+                        if i >= self.n_ticks:
+                            break
+                    elif self.policy == "stretch":
+                        self.start_ns += late
+                        late = 0
+                self.lateness[self.released] = late
+                self.released += 1
+                self.last_lateness_ns = late
+                yield i
+                i += 1
+        finally:
+            restore_realtime(previous)
+
+    def summary(self) -> dict:
+        result = {
+            "ticks": self.released,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "policy": self.policy,
+            "cancelled": self.cancelled,
+        }
+        if self.released:
+            us = self.lateness[: self.released] / 1000.0
+            result.update(
+                lateness_p50_us=float(np.percentile(us, 50)),
+                lateness_p99_us=float(np.percentile(us, 99)),
+                lateness_max_us=float(us.max()),
+            )
+        return result
+
+    def log_summary(self):
+        logger.info(f"Tick scheduler ({self.period_ns / 1e6:g} ms period): {self.summary()}")
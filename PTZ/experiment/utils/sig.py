@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import os
 from os.path import join
 from utils.logger import logger
+from utils.iq_file import save_cfile
+from utils.resample import resample
 
 
 def gen_up_chirp(
@@ -47,6 +49,29 @@ def gen_preamble(
     return sig, t
 
 
+def gen_symbols(
+    up_chirp: np.ndarray[np.complex64], SF: int, symbols: np.ndarray[np.int64]
+) -> np.ndarray[np.complex64]:
+    # Each symbol is the base up-chirp cyclically shifted by symbol * oversampling samples;
+    # works for any leading shape of `symbols`, the chirp samples go on the last axis
+    sym_len = up_chirp.size
+    os_factor = sym_len // 2**SF
+    idx = (np.arange(sym_len) + np.asarray(symbols)[..., None] * os_factor) % sym_len
+    return up_chirp[idx]
+
+
+def demodulate(
+    frames: np.ndarray[np.complex64], up_chirp: np.ndarray[np.complex64], SF: int
+) -> np.ndarray[np.int64]:
+    # Dechirp with the conjugate up-chirp, FFT, and fold the wrapped part of the
+    # tone (bin k - 2**SF) back onto bin k before picking the peak
+    M = 2**SF
+    sym_len = up_chirp.size
+    spectrum = np.abs(np.fft.fft(frames * np.conj(up_chirp), axis=-1))
+    folded = spectrum[..., :M] + spectrum[..., (np.arange(M) + sym_len - M) % sym_len]
+    return np.argmax(folded, axis=-1)
+
+
 def gen_sine_wave(sample_rate: float, freq: float, duration: float):
     t = np.arange(0, duration, 1 / sample_rate)
     return np.exp(1j * 2 * np.pi * freq * t), t
@@ -70,9 +95,8 @@ def add_noise(
     if not silent:
         logger.info("[1/3] Creating Noise...")
     if unit_noise is None:
-        sig_size = sig.size
-        real = np.random.randn(sig_size)
-        imag = np.random.randn(sig_size)
+        real = np.random.randn(*sig.shape)
+        imag = np.random.randn(*sig.shape)
         unit_noise = (real + 1j * imag) / np.sqrt(2)
     noise = (unit_noise * np.sqrt(noise_power)).astype(sig.dtype)
     if not silent:
@@ -88,19 +112,155 @@ def add_noise(
     return out_sig
 
 
+def welch_psd(
+    sig: np.ndarray[np.complex64],
+    samp_rate: float,
+    nperseg=4096,
+    overlap=0.5,
+    batch_segments=256,
+) -> tuple[np.ndarray[np.float64], np.ndarray[np.float64]]:
+    # Averaged periodogram, computed batch_segments FFTs at a time so memory
+    # stays bounded for memmapped recordings
+    nperseg = min(nperseg, sig.size)
+    step = max(1, int(nperseg * (1 - overlap)))
+    window = np.hanning(nperseg)
+    scale = samp_rate * np.sum(window**2)
+    segments = np.lib.stride_tricks.sliding_window_view(sig, nperseg)[::step]
+    psd = np.zeros(nperseg, dtype=np.float64)
+    for i in range(0, segments.shape[0], batch_segments):
+        spectrum = np.fft.fft(segments[i : i + batch_segments] * window, axis=1)
+        psd += np.sum(np.abs(spectrum) ** 2, axis=0)
+    psd /= segments.shape[0] * scale
+    freq = np.fft.fftshift(np.fft.fftfreq(nperseg, 1 / samp_rate))
+    return freq, np.fft.fftshift(psd)
+
+
+def spectrogram(
+    sig: np.ndarray[np.complex64],
+    samp_rate: float,
+    nfft=1024,
+    max_frames=2000,
+) -> tuple[np.ndarray[np.float64], np.ndarray[np.float64], np.ndarray[np.float64]]:
+    # STFT with at most max_frames columns: the hop grows with the signal so the
+    # cost depends on the output resolution, not on the capture length
+    nfft = min(nfft, sig.size)
+    frames_num = min(max_frames, sig.size // nfft)
+    starts = np.linspace(0, sig.size - nfft, frames_num).astype(np.int64)
+    window = np.hanning(nfft)
+    frames = np.lib.stride_tricks.sliding_window_view(sig, nfft)[starts]
+    power = np.abs(np.fft.fftshift(np.fft.fft(frames * window, axis=1), axes=1)) ** 2
+    freq = np.fft.fftshift(np.fft.fftfreq(nfft, 1 / samp_rate))
+    t = (starts + nfft / 2) / samp_rate
+    return freq, t, 10 * np.log10(power.T + 1e-20)
+
+
+def minmax_decimate(
+    y: np.ndarray[np.float64], width: int
+) -> tuple[np.ndarray[np.int64], np.ndarray[np.float64], np.ndarray[np.float64]]:
+    # Min/max envelope per output pixel: keeps every peak visible while only
+    # 2 * width points reach matplotlib
+    if y.size <= 2 * width:
+        idx = np.arange(y.size)
+        return idx, y, y
+    block = y.size // width
+    blocks = np.asarray(y[: block * width]).reshape(width, block)
+    idx = np.arange(width) * block + block // 2
+    return idx, blocks.min(axis=1), blocks.max(axis=1)
+
+
+def fast_analysis(
+    sig: np.ndarray[np.complex64],
+    samp_rate: float,
+    output_dir: str,
+    width_px=2000,
+    nperseg=4096,
+    render=True,
+    export=False,
+):
+    # Welch PSD + spectrogram + decimated envelopes; the full-length FFT and
+    # per-sample plotting of analysis() are never done
+    os.makedirs(output_dir, exist_ok=True)
+    logger.info(
+        f"Fast analysis: sig.size={sig.size}, Sample rate: {samp_rate}, width_px={width_px}, nperseg={nperseg}"
+    )
+    psd_freq, psd = welch_psd(sig, samp_rate, nperseg)
+    spec_freq, spec_t, spec = spectrogram(sig, samp_rate, min(nperseg, 1024), width_px)
+    env_idx, re_min, re_max = minmax_decimate(np.real(sig), width_px)
+    _, im_min, im_max = minmax_decimate(np.imag(sig), width_px)
+    env_t = env_idx / samp_rate
+    if export:
+        np.savez_compressed(
+            join(output_dir, "analysis.npz"),
+            samp_rate=samp_rate,
+            psd_freq=psd_freq,
+            psd=psd,
+            spec_freq=spec_freq,
+            spec_t=spec_t,
+            spec=spec.astype(np.float32),
+            env_t=env_t,
+            re_min=re_min,
+            re_max=re_max,
+            im_min=im_min,
+            im_max=im_max,
+        )
+        logger.info(f"Saved analysis data to {join(output_dir, 'analysis.npz')!r}")
+    if not render:
+        return output_dir
+    dpi = 100
+    fig_size = (width_px / dpi, 6)
+    plt.figure(figsize=fig_size, dpi=dpi)
+    plt.plot(psd_freq, 10 * np.log10(psd + 1e-20))
+    plt.xlabel(f"Frequency (Hz), Welch nperseg={nperseg}")
+    plt.ylabel("PSD (dB/Hz)")
+    plt.title("Spectrum")
+    plt.grid()
+    plt.savefig(join(output_dir, "spectrum.png"))
+    plt.close()
+    plt.figure(figsize=fig_size, dpi=dpi)
+    plt.imshow(
+        spec,
+        aspect="auto",
+        origin="lower",
+        extent=(spec_t[0], spec_t[-1], spec_freq[0], spec_freq[-1]),
+    )
+    plt.xlabel("Time (s)")
+    plt.ylabel("Frequency (Hz)")
+    plt.title("Spectrogram")
+    plt.colorbar(label="dB")
+    plt.savefig(join(output_dir, "spectrogram.png"))
+    plt.close()
+    plt.figure(figsize=fig_size, dpi=dpi)
+    plt.fill_between(env_t, re_min, re_max, label="Real part", alpha=0.7)
+    plt.fill_between(env_t, im_min, im_max, label="Imaginary part", alpha=0.7)
+    plt.xlabel("Time (s)")
+    plt.ylabel("Amplitude")
+    plt.title("Complex Sinusoidal Signal (min/max envelope)")
+    plt.legend()
+    plt.grid()
+    plt.savefig(join(output_dir, "time_domain_complex.png"))
+    plt.close()
+    logger.info(f"Saved spectrum, spectrogram and time domain plots to {output_dir!r}")
+    return output_dir
+
+
 def analysis(
     sig: np.ndarray[np.complex64],
     t: np.ndarray[np.float64],
     output_dir: str,
     fig_size=(80, 20),
     zero_padding=1,
+    fast=False,
+    width_px=2000,
+    render=True,
+    export=False,
 ):
     os.makedirs(output_dir, exist_ok=True)
     logger.info(f"Output dir: {output_dir!r}")
     duration = t[-1] - t[0]
     samp_rate = 1 / (t[1] - t[0])
-    with open(join(output_dir, "sig.cfile"), "wb") as of:
-        sig.astype(np.complex64).tofile(of)
+    save_cfile(join(output_dir, "sig.cfile"), sig, samp_rate)
+    if fast:
+        return fast_analysis(sig, samp_rate, output_dir, width_px, render=render, export=export)
     sig_timedomain = np.abs(sig) * np.cos(np.angle(sig))
     if zero_padding < 0:
         logger.error(f"Invalid zero_padding: {zero_padding}")
@@ -129,7 +289,6 @@ def analysis(
     plt.title("Time Domain")
     plt.savefig(join(output_dir, "time_domain.png"))
     logger.info(f"Saved time domain to {join(output_dir, 'time_domain.png')!r}")
-    plt.figure()
     plt.close()
     plt.figure(figsize=fig_size)
     plt.plot(t, np.real(sig), label="Real part")
@@ -148,10 +307,14 @@ def analysis(
 
 
 def down_sample(
-    sig: np.ndarray[np.complex64] | np.ndarray[np.complex128], factor: int
+    sig: np.ndarray[np.complex64] | np.ndarray[np.complex128], factor: int, anti_alias=True
 ) -> np.ndarray[np.complex64] | np.ndarray[np.complex128]:
-    logger.info(f"Downsampling factor: {factor}")
-    return sig[::factor]
+    logger.info(f"Downsampling factor: {factor}, anti_alias: {anti_alias}")
+    if not anti_alias:
+        return sig[::factor]
+    # polyphase low-pass decimation with the filter delay removed, so samples line up with sig[::factor];
+    # use utils.resample.Resampler directly for streams
+    return resample(sig, 1, factor)
 
 
 def slicing(
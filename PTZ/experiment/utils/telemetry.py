@@ -0,0 +1,399 @@
+import json
+import queue
+import threading
+import time
+from socket import AF_INET, SOCK_DGRAM, socket, timeout
+
+from .logger import logger
+from .ptz_command import send_command, work_mode_dict
+
+# 云台遥测：独立线程按自己的周期查询工作模式(0xe0)、工作状态(0xdd)和温度(0xd6)，
+# 解析成 TelemetryRecord 存入固定容量的环形缓冲区。
+# 云台的回包端口：原先的连接方式是绑定固定的本地端口(local_port = 139)，说明云台可能把回包
+# 发到这个固定端口，而不是请求的来源端口。所以默认和跟踪循环共用同一个 socket：
+# 由 ReplyRouter 的一个接收线程收所有回包，按帧类型分给遥测和跟踪循环各自的队列，
+# 双方不用互相等待，遥测也不会改动跟踪循环看到的超时和阻塞模式。
+# 只有确认云台按来源端口回包时，才用独立 socket(另一个本地端口)轮询。
+
+STATUS_FRAME_COUNT = 13  # 0xdd 查询返回的状态包数量
+# 遥测回包的类型字节(response[2])：工作模式、状态包、温度；其余(角度定位确认、角度查询回复)归跟踪循环
+TELEMETRY_FRAME_TYPES = frozenset([0xE0, 0xD6, *range(0x21, 0x30)])
+
+
+class TelemetryRecord:
+    __slots__ = (
+        "t",
+        "work_mode",
+        "h_motor_ok",
+        "h_dir",
+        "h_running",
+        "h_hall_ok",
+        "h_switch_ok",
+        "v_motor_ok",
+        "v_dir",
+        "v_running",
+        "v_hall_ok",
+        "v_switch_ok",
+        "temp_ok",
+        "temperature",
+        "volt_ok",
+        "voltage",
+        "power1",
+        "power2",
+        "current_ok",
+        "current",
+        "switch_ok",
+        "frames",
+    )
+
+    def __init__(self, t=None):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.t = time.time() if t is None else t
+        self.frames = 0
+
+    @property
+    def work_mode_desc(self) -> str | None:
+        if self.work_mode is None:
+            return None
+        return work_mode_dict.get(self.work_mode, f"未知模式 (值: {self.work_mode})")
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v}" for k, v in self.as_dict().items() if v is not None)
+        return f"TelemetryRecord({fields})"
+
+
+def _word(frame) -> float:
+    return ((frame[4] << 8) + frame[5]) / 100.0
+
+
+def _h_motor(rec, f):
+    rec.h_motor_ok, rec.h_dir, rec.h_running = f[3] == 0, f[4], f[5] != 0
+
+
+def _h_hall(rec, f):
+    rec.h_hall_ok = f[3] == 0
+
+
+def _h_switch(rec, f):
+    rec.h_switch_ok = f[3] == 0
+
+
+def _v_motor(rec, f):
+    rec.v_motor_ok, rec.v_dir, rec.v_running = f[3] == 0, f[4], f[5] != 0
+
+
+def _v_hall(rec, f):
+    rec.v_hall_ok = f[3] == 0
+
+
+def _v_switch(rec, f):
+    rec.v_switch_ok = f[3] == 0
+
+
+def _temp(rec, f):
+    rec.temp_ok, rec.temperature = f[3] == 0, _word(f)
+
+
+def _volt(rec, f):
+    rec.volt_ok, rec.voltage = f[3] == 0, _word(f)
+
+
+def _power(rec, f):
+    rec.power1, rec.power2 = f[3] == 1, f[4] == 1
+
+
+def _current(rec, f):
+    rec.current_ok, rec.current = f[3] == 0, _word(f)
+
+
+def _switch(rec, f):
+    rec.switch_ok = f[3] == 0
+
+
+# 状态包类型(response[2]) -> 解析函数，对应 response_dict
+status_parsers = {
+    0x21: _h_motor,
+    0x22: _h_hall,
+    0x23: _h_switch,
+    0x24: _v_motor,
+    0x25: _v_hall,
+    0x26: _v_switch,
+    0x27: _temp,
+    0x28: _volt,
+    0x29: _power,
+    0x2A: _current,
+    0x2F: _switch,
+}
+
+
+def parse_status_frame(rec: TelemetryRecord, frame: bytes) -> bool:
+    if len(frame) < 6:
+        return False
+    parser = status_parsers.get(frame[2])
+    if parser is None:
+        return False
+    parser(rec, frame)
+    rec.frames += 1
+    return True
+
+
+class RingBuffer:
+    """Fixed-capacity buffer that keeps the newest `capacity` items."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._next = 0  # total number of items ever appended
+        self._lock = threading.Lock()
+
+    def append(self, item):
+        with self._lock:
+            self._items[self._next % self.capacity] = item
+            self._next += 1
+
+    def __len__(self):
+        return min(self._next, self.capacity)
+
+    def snapshot(self) -> list:
+        # oldest -> newest
+        with self._lock:
+            n = min(self._next, self.capacity)
+            start = self._next - n
+            return [self._items[i % self.capacity] for i in range(start, self._next)]
+
+    def latest(self, n=1) -> list:
+        return self.snapshot()[-n:]
+
+    def since(self, t: float) -> list:
+        return [rec for rec in self.snapshot() if rec.t >= t]
+
+
+class _RoutedSocket:
+    # ReplyRouter 的一路出口：sendto 直接走底层 socket，recvfrom 从自己的队列取，
+    # 超时和阻塞模式只属于这一路，ptz_command 里的函数可以原样使用
+    def __init__(self, router, maxsize):
+        self.router = router
+        self.replies = queue.Queue(maxsize)
+        self._timeout = None
+        self.dropped = 0
+
+    def _put(self, item):
+        try:
+            self.replies.put_nowait(item)
+        except queue.Full:
+            # 没人读的旧回包丢掉最早的
+            try:
+                self.replies.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.replies.put_nowait(item)
+
+    def sendto(self, data, addr):
+        return self.router.sock.sendto(data, addr)
+
+    def settimeout(self, value):
+        self._timeout = value
+
+    def gettimeout(self):
+        return self._timeout
+
+    def setblocking(self, flag):
+        self._timeout = None if flag else 0.0
+
+    def recvfrom(self, bufsize):
+        try:
+            if self._timeout == 0.0:
+                data, addr = self.replies.get_nowait()
+            else:
+                data, addr = self.replies.get(timeout=self._timeout)
+        except queue.Empty:
+            if self._timeout == 0.0:
+                raise BlockingIOError("no reply queued") from None
+            raise timeout("timed out") from None
+        return data[:bufsize], addr
+
+    def close(self):
+        pass
+
+
+class ReplyRouter:
+    """
+    Single receive loop on a socket shared by tracking and telemetry.
+
+    Every reply is routed by frame type: telemetry replies
+    (TELEMETRY_FRAME_TYPES) go to `telemetry`, everything else (angle-set
+    acks, angle readbacks) to `tracking`. Both are socket-like objects with
+    their own timeout, so neither side waits for or steals the other's
+    replies and the tracking loop keeps its own receive timing.
+    """
+
+    def __init__(self, sock, maxsize=256):
+        self.sock = sock
+        self.tracking = _RoutedSocket(self, maxsize)
+        self.telemetry = _RoutedSocket(self, maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        self.sock.settimeout(0.1)  # 只为了能及时退出
+        while not self._stop.is_set():
+            try:
+                item = self.sock.recvfrom(1024)
+            except timeout:
+                continue
+            except OSError:
+                break
+            data = item[0]
+            target = self.telemetry if len(data) > 2 and data[2] in TELEMETRY_FRAME_TYPES else self.tracking
+            target._put(item)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ptz-replies", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class TelemetryPoller:
+    """
+    Background poller for work mode, status frames and temperature.
+
+    Pass the tracking socket as `share` to poll over it (the gimbal is
+    assumed to reply to the host's fixed port, so a second socket would
+    never see the replies): a ReplyRouter then owns all receiving on it and
+    the tracking loop must use `tracking_sock` instead of the raw socket.
+    Otherwise a private socket (`sock`, or one bound to local_ip:local_port,
+    0 = any free port) is used, which only works if the gimbal replies to
+    the source port.
+    """
+
+    def __init__(
+        self,
+        ptz_addr,
+        add,
+        local_ip="0.0.0.0",
+        local_port=0,
+        period=5.0,
+        capacity=1024,
+        recv_timeout=0.5,
+        sock=None,
+        share=None,
+    ):
+        self.ptz_addr = ptz_addr
+        self.add = add
+        self.period = period
+        self.recv_timeout = recv_timeout
+        self.records = RingBuffer(capacity)
+        self.router = None
+        self.tracking_sock = None
+        self.owns_sock = sock is None and share is None
+        if share is not None:
+            self.router = ReplyRouter(share).start()
+            sock, self.tracking_sock = self.router.telemetry, self.router.tracking
+        elif sock is None:
+            sock = socket(AF_INET, SOCK_DGRAM)
+            sock.bind((local_ip, local_port))
+        self.sock = sock
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _recv(self):
+        try:
+            response, _ = self.sock.recvfrom(1024)
+            return response
+        except timeout:
+            return None
+
+    def _drain(self):
+        # 丢弃上一轮迟到的回包，避免错位
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self.sock.recvfrom(1024)
+        except (BlockingIOError, OSError):
+            pass
+
+    def poll_once(self) -> TelemetryRecord:
+        rec = TelemetryRecord()
+        self._drain()
+        self.sock.settimeout(self.recv_timeout)
+
+        send_command(self.sock, self.ptz_addr, [0xE0, 0x00, 0x00, 0x00], self.add)
+        response = self._recv()
+        if response is not None and len(response) > 3:
+            rec.work_mode = response[3]
+
+        send_command(self.sock, self.ptz_addr, [0xDD, 0x00, 0x00, 0x00], self.add)
+        for _ in range(STATUS_FRAME_COUNT):
+            response = self._recv()
+            if response is None:
+                break
+            parse_status_frame(rec, response)
+
+        send_command(self.sock, self.ptz_addr, [0xD6, 0x00, 0x00, 0x00], self.add)
+        response = self._recv()
+        if response is not None and len(response) > 4:
+            rec.temperature = ((response[3] << 8) + response[4]) / 100.0
+
+        self.records.append(rec)
+        return rec
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except OSError as e:
+                logger.warning(f"Telemetry poll failed: {e}")
+            self._stop.wait(max(0.0, self.period - (time.monotonic() - started)))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ptz-telemetry", daemon=True)
+        self._thread.start()
+        logger.info(f"Telemetry poller started, period {self.period} s, capacity {self.records.capacity}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def latest(self) -> TelemetryRecord | None:
+        latest = self.records.latest(1)
+        return latest[0] if latest else None
+
+    def dump(self, path: str) -> str:
+        # JSON lines, one record per line, oldest first
+        with open(path, "w") as f:
+            for rec in self.records.snapshot():
+                f.write(json.dumps(rec.as_dict(), ensure_ascii=False) + "\n")
+        logger.info(f"Dumped {len(self.records)} telemetry records to {path!r}")
+        return path
+
+    def close(self):
+        # 共用的跟踪 socket 由调用方关闭
+        self.stop()
+        if self.router is not None:
+            self.router.close()
+        if self.owns_sock:
+            self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,110 @@
+import numpy as np
+
+from .logger import logger
+from .pass_plan import PassPlan
+
+
+def angular_separation(az1, el1, az2, el2):
+    # great-circle angle between two pointings, degrees
+    az1, el1, az2, el2 = (np.radians(x) for x in (az1, el1, az2, el2))
+    cos_d = np.sin(el1) * np.sin(el2) + np.cos(el1) * np.cos(el2) * np.cos(az1 - az2)
+    return np.degrees(np.arccos(np.clip(cos_d, -1.0, 1.0)))
+
+
+def _wrap180(x):
+    return (x + 180.0) % 360.0 - 180.0
+
+
+class TrackingRecorder:
+    """
+    Commanded-vs-actual pointing log for one pass.
+
+    Every angle readback is stored next to the PassPlan pointing at the same
+    timestamp in preallocated columns; save() writes them to a compressed
+    .npz and summary() reduces them to error, lag and overshoot statistics.
+    az_offset is the gimbal's azimuth zero (azimuth_ptz) so both columns are
+    in gimbal coordinates.
+    """
+
+    def __init__(self, plan: PassPlan, readback_period: float, az_offset=0.0, capacity=None):
+        self.plan = plan
+        self.az_offset = az_offset
+        if capacity is None:
+            capacity = int((plan.set_time - plan.t0) / max(readback_period, 1e-3)) + 16
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.az = np.zeros(capacity, dtype=np.float32)
+        self.el = np.zeros(capacity, dtype=np.float32)
+        self.n = 0
+
+    def add(self, t: float, azimuth: float, elevation: float):
+        if self.n == self.t.size:
+            # past the planned length (late finish): grow once by half
+            grow = max(16, self.t.size // 2)
+            self.t = np.concatenate((self.t, np.zeros(grow, dtype=self.t.dtype)))
+            self.az = np.concatenate((self.az, np.zeros(grow, dtype=self.az.dtype)))
+            self.el = np.concatenate((self.el, np.zeros(grow, dtype=self.el.dtype)))
+        self.t[self.n] = t
+        self.az[self.n] = azimuth
+        self.el[self.n] = elevation
+        self.n += 1
+
+    def columns(self, lag=0.0) -> dict:
+        t = self.t[: self.n]
+        cmd_az, cmd_el = self.plan.at(t - lag)
+        return {
+            "t": t,
+            "az": self.az[: self.n],
+            "el": self.el[: self.n],
+            "cmd_az": ((cmd_az - self.az_offset) % 360).astype(np.float32),
+            "cmd_el": cmd_el.astype(np.float32),
+        }
+
+    def estimate_lag(self, max_lag=3.0, step=0.01) -> float:
+        # time shift of the plan that best explains the readings (positive = gimbal behind)
+        if self.n < 2:
+            return 0.0
+        t = self.t[: self.n]
+        best_lag, best_err = 0.0, np.inf
+        for lag in np.arange(0.0, max_lag + step, step):
+            cmd_az, cmd_el = self.plan.at(t - lag)
+            err = np.mean(angular_separation(cmd_az - self.az_offset, cmd_el, self.az[: self.n], self.el[: self.n]) ** 2)
+            if err < best_err:
+                best_lag, best_err = float(lag), err
+        return best_lag
+
+    def summary(self) -> dict:
+        if self.n == 0:
+            return {"readings": 0}
+        cols = self.columns()
+        az_err = _wrap180(cols["az"] - cols["cmd_az"])
+        el_err = cols["el"] - cols["cmd_el"]
+        pointing = angular_separation(cols["cmd_az"], cols["cmd_el"], cols["az"], cols["el"])
+        # overshoot: how far the gimbal got ahead of the command along the direction of motion
+        az_rate, el_rate = self.plan.rates()
+        idx = np.clip(np.round((cols["t"] - self.plan.t0) * 1000.0 / self.plan.tick_time).astype(int), 0, len(self.plan) - 1)
+        az_overshoot = np.max(np.maximum(az_err * np.sign(az_rate[idx]), 0.0))
+        el_overshoot = np.max(np.maximum(el_err * np.sign(el_rate[idx]), 0.0))
+        return {
+            "readings": int(self.n),
+            "pointing_err_mean": float(np.mean(pointing)),
+            "pointing_err_rms": float(np.sqrt(np.mean(pointing**2))),
+            "pointing_err_p95": float(np.percentile(pointing, 95)),
+            "pointing_err_max": float(np.max(pointing)),
+            "az_err_rms": float(np.sqrt(np.mean(az_err**2))),
+            "el_err_rms": float(np.sqrt(np.mean(el_err**2))),
+            "az_overshoot_max": float(az_overshoot),
+            "el_overshoot_max": float(el_overshoot),
+            "lag": self.estimate_lag(),
+        }
+
+    def save(self, path: str) -> str:
+        summary = self.summary()
+        np.savez_compressed(
+            path,
+            rise_time=self.plan.t0,
+            tick_time=self.plan.tick_time,
+            **self.columns(),
+            **{f"summary_{k}": v for k, v in summary.items()},
+        )
+        logger.info(f"Saved {self.n} tracking readings to {path!r}: {summary}")
+        return path